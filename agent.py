@@ -1,14 +1,148 @@
-from pydantic import BaseModel
-from anthropic import Anthropic
+from typing import Callable, Dict, Optional
+from pydantic import BaseModel, field_validator
+from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
+import asyncio
+import concurrent.futures
+import threading
+import httpx
 import json
+from collections import deque
+from pathlib import Path
 
-# Initialize Anthropic client (will be set from the main app)
-client = None
+from cache import ResponseCache
 
-def set_anthropic_client(api_key: str):
-    """Set the Anthropic client with the provided API key."""
+MODEL = "claude-sonnet-4-20250514"
+
+# Shared async Anthropic client (will be set from the main app)
+client: Optional[AsyncAnthropic] = None
+
+# Cache of agent responses shared by every tour (set to None to disable)
+response_cache: Optional[ResponseCache] = ResponseCache(Path(__file__).parent / ".cache" / "responses.sqlite")
+
+# Token usage of recent Claude calls
+usage_log: deque = deque(maxlen=500)
+
+# Long-lived event loop that owns the client's pooled connections
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+def set_anthropic_client(
+    api_key: str,
+    max_connections: int = 20,
+    max_keepalive_connections: int = 10,
+    keepalive_expiry: float = 30.0,
+):
+    """Set the shared async Anthropic client with the provided API key.
+
+    The client keeps a pool of keep-alive connections so concurrent agent calls
+    reuse sockets instead of opening a new TLS session per request. Calling this
+    again with the same key keeps the existing client and its pool.
+    """
     global client
-    client = Anthropic(api_key=api_key)
+    if client is not None and client.api_key == api_key:
+        return
+    client = AsyncAnthropic(
+        api_key=api_key,
+        http_client=DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            )
+        ),
+    )
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """Return the background event loop, starting it on first use."""
+    global _loop
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="agent-loop", daemon=True).start()
+        return _loop
+
+def submit(func, *args, **kwargs) -> concurrent.futures.Future:
+    """Schedule an agent coroutine function on the shared agent event loop.
+
+    Returns a ``concurrent.futures.Future`` so synchronous callers can keep
+    doing work (e.g. updating the UI) while the agents run.
+    """
+    return asyncio.run_coroutine_threadsafe(func(*args, **kwargs), _get_loop())
+
+def run_sync(func, *args, **kwargs):
+    """Run an agent coroutine function from synchronous code and return its result.
+
+    Every call is scheduled on the same background event loop, so the pooled
+    connections of the async client survive across calls instead of being tied
+    to a short-lived ``asyncio.run`` loop.
+    """
+    return submit(func, *args, **kwargs).result()
+
+def record_usage(message) -> dict:
+    """Append the token usage of a Messages API response to ``usage_log``."""
+    usage = message.usage
+    entry = {
+        "model": message.model,
+        "input_tokens": usage.input_tokens,
+        "output_tokens": usage.output_tokens,
+        "cache_creation_input_tokens": getattr(usage, "cache_creation_input_tokens", None) or 0,
+        "cache_read_input_tokens": getattr(usage, "cache_read_input_tokens", None) or 0,
+    }
+    usage_log.append(entry)
+    return entry
+
+def usage_summary() -> dict:
+    """Totals over ``usage_log``."""
+    keys = ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")
+    totals = {key: sum(entry[key] for entry in usage_log) for key in keys}
+    totals["calls"] = len(usage_log)
+    return totals
+
+class TruncatedResponse(ValueError):
+    """A response stopped at ``max_tokens`` where only a complete one is usable."""
+
+async def _complete(
+    on_text: Optional[Callable[[str], None]] = None,
+    require_complete: bool = False,
+    use_cache: bool = True,
+    **kwargs,
+) -> str:
+    """Send a Messages API request through the shared async client and return its text.
+
+    When ``on_text`` is given the response is streamed and every text delta is
+    passed to it as soon as it arrives. Responses are served from and stored in
+    ``response_cache`` when it is set, unless ``use_cache`` is False for this
+    call. With ``require_complete`` a response cut
+    off by ``max_tokens`` raises ``TruncatedResponse`` instead of being returned.
+    """
+    key = None
+    if response_cache is not None and use_cache:
+        key = ResponseCache.make_key(
+            kwargs["model"], kwargs.get("system"), kwargs["messages"], kwargs["max_tokens"]
+        )
+        cached = response_cache.get(key)
+        if cached is not None:
+            if on_text is not None:
+                on_text(cached)
+            return cached
+
+    if client is None:
+        raise RuntimeError("Anthropic client is not set. Call set_anthropic_client first.")
+    if on_text is None:
+        message = await client.messages.create(**kwargs)
+    else:
+        async with client.messages.stream(**kwargs) as stream:
+            async for text in stream.text_stream:
+                on_text(text)
+            message = await stream.get_final_message()
+    record_usage(message)
+
+    text = message.content[0].text
+    if require_complete and message.stop_reason == "max_tokens":
+        raise TruncatedResponse(f"response cut off at max_tokens={kwargs['max_tokens']}")
+    if key is not None and message.stop_reason != "max_tokens":
+        response_cache.set(key, text)
+    return text
 
 # ============ Output Models ============
 
@@ -40,6 +174,17 @@ class FinalTour(BaseModel):
     culinary: str
     conclusion: str
 
+class TourFrame(BaseModel):
+    introduction: str
+    transitions: Dict[str, str] = {}
+    conclusion: str
+
+    @field_validator("transitions")
+    @classmethod
+    def normalize_transition_keys(cls, transitions: Dict[str, str]) -> Dict[str, str]:
+        # The model may key transitions as "History" or " culture "
+        return {key.lower().strip(): text for key, text in transitions.items()}
+
 # ============ Agent Instructions ============
 
 ARCHITECTURE_AGENT_INSTRUCTIONS = """You are the Architecture agent for a self-guided audio tour system. Given a location and the areas of interest of user, your role is to:
@@ -159,73 +304,212 @@ Example:
 
 Only return the JSON object, no other text."""
 
+ASSEMBLY_INSTRUCTIONS = """Your Role
+You are the Orchestrator Agent for a self-guided audio tour system. The specialist sections of the tour are already written and will be played exactly as they are. Your only job is to write the connective narration around them.
+
+Your Tasks:
+
+1. Introduction (1-2 minutes)
+Write an engaging and warm introduction that:
+- Welcomes the user to the specific location
+- Briefly outlines what the tour will cover, in the order the sections are given
+- Sets the tone for the experience (conversational and immersive)
+
+2. Transitions
+For every section, write one or two natural sentences that lead the listener into it:
+- The first transition moves from the introduction into the first section
+- Every other transition moves from the end of the previous section into the next one
+- Connect themes when possible and never repeat content from the sections
+
+3. Conclusion
+Write a thoughtful, concise and short conclusion that:
+- Summarizes key highlights from the tour
+- Reinforces the uniqueness of the location
+- Encourages the listener to explore further
+
+Do not rewrite, repeat or quote the sections themselves. Do not use headings, markdown, links or citations; everything will be converted directly to speech.
+
+IMPORTANT: Return your response as a valid JSON object with these exact keys:
+- introduction: string
+- transitions: object mapping each section name (lowercase) to its lead-in text
+- conclusion: string
+
+Only return the JSON object, no other text."""
+
+INTRODUCTION_INSTRUCTIONS = """You are the Orchestrator Agent for a self-guided audio tour system. The specialist sections of the tour are being written while you work, so you only know the location, the sections and the tour duration.
+
+Write an engaging and warm introduction that:
+- Welcomes the user to the specific location
+- Briefly outlines what the tour will cover, in the order the sections are given
+- Sets the tone for the experience (conversational and immersive)
+- Ends by leading the listener into the first section
+
+Do not use headings, markdown, links or citations; everything will be converted directly to speech. Only return the introduction itself."""
+
+CONCLUSION_INSTRUCTIONS = """You are the Orchestrator Agent for a self-guided audio tour system. The listener has just heard the specialist sections of the tour, given to you below.
+
+Write a thoughtful, concise and short conclusion that:
+- Summarizes key highlights from the tour
+- Reinforces the uniqueness of the location
+- Encourages the listener to explore further
+
+Do not rewrite or quote the sections themselves. Do not use headings, markdown, links or citations; everything will be converted directly to speech. Only return the conclusion itself."""
+
 # ============ Agent Functions ============
 
-async def run_architecture_agent(query: str, interests: list, word_limit: int) -> Architecture:
-    """Run the architecture agent using Claude."""
+def _parse_json(response_text: str) -> dict:
+    """Parse a JSON object from a model response, tolerating markdown code fences."""
+    response_text = response_text.strip()
+    # Handle potential markdown code blocks
+    if response_text.startswith("```"):
+        response_text = response_text.split("```")[1]
+        if response_text.startswith("json"):
+            response_text = response_text[4:]
+        response_text = response_text.strip()
+    return json.loads(response_text)
+
+async def run_architecture_agent(
+    query: str,
+    interests: list,
+    word_limit: int,
+    on_text: Optional[Callable[[str], None]] = None,
+    max_tokens: int = 2048,
+    use_cache: bool = True,
+) -> Architecture:
+    """Run the architecture agent using Claude, streaming text to ``on_text`` if given."""
     prompt = f"""Query: {query}
 Interests: {', '.join(interests)}
 Word Limit: {word_limit} - {word_limit + 20}
 
 Instructions: Create engaging architectural content for an audio tour. Focus on visual descriptions and interesting design details. Make it conversational and include specific buildings and their unique features. The content should be approximately {word_limit} words."""
 
-    message = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=2048,
+    text = await _complete(
+        on_text,
+        use_cache=use_cache,
+        model=MODEL,
+        max_tokens=max_tokens,
         system=ARCHITECTURE_AGENT_INSTRUCTIONS,
         messages=[{"role": "user", "content": prompt}]
     )
-    return Architecture(output=message.content[0].text)
-
-async def run_culinary_agent(query: str, interests: list, word_limit: int) -> Culinary:
-    """Run the culinary agent using Claude."""
+    return Architecture(output=text)
+
+async def run_culinary_agent(
+    query: str,
+    interests: list,
+    word_limit: int,
+    on_text: Optional[Callable[[str], None]] = None,
+    max_tokens: int = 2048,
+    use_cache: bool = True,
+) -> Culinary:
+    """Run the culinary agent using Claude, streaming text to ``on_text`` if given."""
     prompt = f"""Query: {query}
 Interests: {', '.join(interests)}
 Word Limit: {word_limit} - {word_limit + 20}
 
 Instructions: Create engaging culinary content for an audio tour. Focus on local specialties, food history, and interesting stories about restaurants and dishes. The content should be approximately {word_limit} words."""
 
-    message = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=2048,
+    text = await _complete(
+        on_text,
+        use_cache=use_cache,
+        model=MODEL,
+        max_tokens=max_tokens,
         system=CULINARY_AGENT_INSTRUCTIONS,
         messages=[{"role": "user", "content": prompt}]
     )
-    return Culinary(output=message.content[0].text)
-
-async def run_culture_agent(query: str, interests: list, word_limit: int) -> Culture:
-    """Run the culture agent using Claude."""
+    return Culinary(output=text)
+
+async def run_culture_agent(
+    query: str,
+    interests: list,
+    word_limit: int,
+    on_text: Optional[Callable[[str], None]] = None,
+    max_tokens: int = 2048,
+    use_cache: bool = True,
+) -> Culture:
+    """Run the culture agent using Claude, streaming text to ``on_text`` if given."""
     prompt = f"""Query: {query}
 Interests: {', '.join(interests)}
 Word Limit: {word_limit} - {word_limit + 20}
 
 Instructions: Create engaging cultural content for an audio tour. Focus on local traditions, arts, and community life. The content should be approximately {word_limit} words."""
 
-    message = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=2048,
+    text = await _complete(
+        on_text,
+        use_cache=use_cache,
+        model=MODEL,
+        max_tokens=max_tokens,
         system=CULTURE_AGENT_INSTRUCTIONS,
         messages=[{"role": "user", "content": prompt}]
     )
-    return Culture(output=message.content[0].text)
-
-async def run_history_agent(query: str, interests: list, word_limit: int) -> History:
-    """Run the history agent using Claude."""
+    return Culture(output=text)
+
+async def run_history_agent(
+    query: str,
+    interests: list,
+    word_limit: int,
+    on_text: Optional[Callable[[str], None]] = None,
+    max_tokens: int = 2048,
+    use_cache: bool = True,
+) -> History:
+    """Run the history agent using Claude, streaming text to ``on_text`` if given."""
     prompt = f"""Query: {query}
 Interests: {', '.join(interests)}
 Word Limit: {word_limit} - {word_limit + 20}
 
 Instructions: Create engaging historical content for an audio tour. Focus on interesting stories and personal connections. The content should be approximately {word_limit} words."""
 
-    message = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=2048,
+    text = await _complete(
+        on_text,
+        use_cache=use_cache,
+        model=MODEL,
+        max_tokens=max_tokens,
         system=HISTORY_AGENT_INSTRUCTIONS,
         messages=[{"role": "user", "content": prompt}]
     )
-    return History(output=message.content[0].text)
-
-async def run_planner_agent(query: str, interests: list, duration: str) -> Planner:
+    return History(output=text)
+
+# Minutes reserved for the introduction and conclusion, and the smallest
+# allocation a selected category may get (mirrors PLANNER_INSTRUCTIONS)
+INTRODUCTION_MINUTES = 1.0
+LONG_TOUR_INTRODUCTION_MINUTES = 2.0
+LONG_TOUR_THRESHOLD_MINUTES = 20
+CONCLUSION_MINUTES = 1.0
+MIN_CATEGORY_MINUTES = 2.0
+
+def plan_tour(interests: list, duration, weights: Optional[Dict[str, float]] = None) -> Planner:
+    """Allocate the tour duration across sections locally, without a Claude call.
+
+    Reserves time for the introduction and conclusion, gives every selected
+    category a minimum share and splits the rest in proportion to ``weights``
+    (e.g. a location's strength per category; every category defaults to 1).
+    """
+    duration = float(duration)
+    weights = {key.lower(): value for key, value in (weights or {}).items()}
+    categories = [
+        interest.lower() for interest in interests
+        if interest.lower() in ("architecture", "history", "culture", "culinary")
+    ]
+
+    introduction = (
+        LONG_TOUR_INTRODUCTION_MINUTES if duration >= LONG_TOUR_THRESHOLD_MINUTES else INTRODUCTION_MINUTES
+    )
+    content = max(0.0, duration - introduction - CONCLUSION_MINUTES)
+
+    allocation = {key: 0.0 for key in ("architecture", "history", "culture", "culinary")}
+    if categories:
+        minimum = min(MIN_CATEGORY_MINUTES, content / len(categories))
+        remaining = content - minimum * len(categories)
+        category_weights = {key: max(0.0, float(weights.get(key, 1.0))) for key in categories}
+        total_weight = sum(category_weights.values())
+        if total_weight <= 0:
+            category_weights = {key: 1.0 for key in categories}
+            total_weight = float(len(categories))
+        for key in categories:
+            allocation[key] = round(minimum + remaining * category_weights[key] / total_weight, 1)
+
+    return Planner(introduction=introduction, conclusion=CONCLUSION_MINUTES, **allocation)
+
+async def run_planner_agent(query: str, interests: list, duration: str, use_cache: bool = True) -> Planner:
     """Run the planner agent using Claude."""
     prompt = f"""Query: {query}
 Interests: {', '.join(interests)}
@@ -233,26 +517,20 @@ Duration: {duration} minutes
 
 Create a time allocation plan for this tour. Return only a JSON object."""
 
-    message = client.messages.create(
-        model="claude-sonnet-4-20250514",
+    response_text = await _complete(
+        use_cache=use_cache,
+        model=MODEL,
         max_tokens=1024,
         system=PLANNER_INSTRUCTIONS,
         messages=[{"role": "user", "content": prompt}]
     )
     
-    # Parse the JSON response
-    response_text = message.content[0].text.strip()
-    # Handle potential markdown code blocks
-    if response_text.startswith("```"):
-        response_text = response_text.split("```")[1]
-        if response_text.startswith("json"):
-            response_text = response_text[4:]
-        response_text = response_text.strip()
-    
-    data = json.loads(response_text)
+    data = _parse_json(response_text)
     return Planner(**data)
 
-async def run_orchestrator_agent(query: str, interests: list, duration: float, research_results: dict) -> FinalTour:
+async def run_orchestrator_agent(
+    query: str, interests: list, duration: float, research_results: dict, use_cache: bool = True
+) -> FinalTour:
     """Run the orchestrator agent using Claude."""
     
     # Build content sections
@@ -282,21 +560,137 @@ Start with a warm welcome and end with a natural closing thought.
 Return a JSON object with keys: introduction, architecture, history, culture, culinary, conclusion
 Use empty string for sections not in the selected interests."""
 
-    message = client.messages.create(
-        model="claude-sonnet-4-20250514",
+    response_text = await _complete(
+        use_cache=use_cache,
+        model=MODEL,
         max_tokens=4096,
         system=ORCHESTRATOR_INSTRUCTIONS,
         messages=[{"role": "user", "content": prompt}]
     )
     
-    # Parse the JSON response
-    response_text = message.content[0].text.strip()
-    # Handle potential markdown code blocks
-    if response_text.startswith("```"):
-        response_text = response_text.split("```")[1]
-        if response_text.startswith("json"):
-            response_text = response_text[4:]
-        response_text = response_text.strip()
-    
-    data = json.loads(response_text)
+    data = _parse_json(response_text)
     return FinalTour(**data)
+
+async def run_assembly_agent(
+    query: str,
+    interests: list,
+    duration: float,
+    research_results: dict,
+    max_tokens: int = 2048,
+    use_cache: bool = True,
+) -> TourFrame:
+    """Run the orchestrator in assembly mode: only the introduction, transitions and conclusion.
+
+    Raises ``ValueError`` (including ``TruncatedResponse``) when the response
+    is cut off or is not a valid frame.
+    """
+    
+    # Build content sections
+    content_sections = []
+    for interest in interests:
+        key = interest.lower()
+        if key in research_results:
+            content_sections.append(f"{key}:\n{research_results[key].output}")
+    
+    prompt = f"""Query: {query}
+Sections In Order: {', '.join(interest.lower() for interest in interests)}
+Total Tour Duration (in minutes): {duration}
+
+Content Sections:
+{chr(10).join(content_sections)}
+
+Instructions: Write the introduction, one transition per section and the conclusion for this tour.
+Make it feel like a friendly guide walking alongside the visitor.
+Include phrases like 'as we walk', 'look to your left', 'notice how', etc.
+
+Return a JSON object with keys: introduction, transitions, conclusion"""
+
+    response_text = await _complete(
+        require_complete=True,
+        use_cache=use_cache,
+        model=MODEL,
+        max_tokens=max_tokens,
+        system=ASSEMBLY_INSTRUCTIONS,
+        messages=[{"role": "user", "content": prompt}]
+    )
+    
+    data = _parse_json(response_text)
+    if not isinstance(data, dict):
+        raise ValueError("assembly response is not a JSON object")
+    return TourFrame(**data)
+
+async def run_introduction_agent(
+    query: str,
+    interests: list,
+    duration: float,
+    word_limit: int,
+    on_text: Optional[Callable[[str], None]] = None,
+    max_tokens: int = 1024,
+    use_cache: bool = True,
+) -> str:
+    """Write the tour introduction before the sections exist, streaming text to ``on_text`` if given."""
+    prompt = f"""Query: {query}
+Sections In Order: {', '.join(interest.lower() for interest in interests)}
+Total Tour Duration (in minutes): {duration}
+Word Limit: {word_limit}
+
+Instructions: Write the introduction for this tour in about {word_limit} words.
+Make it feel like a friendly guide walking alongside the visitor."""
+
+    return await _complete(
+        on_text,
+        use_cache=use_cache,
+        model=MODEL,
+        max_tokens=max_tokens,
+        system=INTRODUCTION_INSTRUCTIONS,
+        messages=[{"role": "user", "content": prompt}]
+    )
+
+async def run_conclusion_agent(
+    query: str,
+    interests: list,
+    research_results: dict,
+    word_limit: int,
+    on_text: Optional[Callable[[str], None]] = None,
+    max_tokens: int = 1024,
+    use_cache: bool = True,
+) -> str:
+    """Write the tour conclusion from the finished sections, streaming text to ``on_text`` if given."""
+    content_sections = []
+    for interest in interests:
+        key = interest.lower()
+        if key in research_results:
+            content_sections.append(f"{key}:\n{research_results[key].output}")
+
+    prompt = f"""Query: {query}
+Word Limit: {word_limit}
+
+Content Sections:
+{chr(10).join(content_sections)}
+
+Instructions: Write the conclusion for this tour in about {word_limit} words."""
+
+    return await _complete(
+        on_text,
+        use_cache=use_cache,
+        model=MODEL,
+        max_tokens=max_tokens,
+        system=CONCLUSION_INSTRUCTIONS,
+        messages=[{"role": "user", "content": prompt}]
+    )
+
+def assemble_tour(frame: TourFrame, interests: list, research_results: dict) -> FinalTour:
+    """Splice the orchestrator's introduction, transitions and conclusion around the untouched specialist sections."""
+    sections = {}
+    for key in ("architecture", "history", "culture", "culinary"):
+        if key not in research_results or key not in [interest.lower() for interest in interests]:
+            sections[key] = ""
+            continue
+        transition = frame.transitions.get(key, "").strip()
+        output = research_results[key].output.strip()
+        sections[key] = f"{transition}\n\n{output}" if transition else output
+    return FinalTour(
+        introduction=frame.introduction,
+        conclusion=frame.conclusion,
+        **sections,
+    )
@@ -1,26 +1,107 @@
 import streamlit as st
-import asyncio
+import os
+import queue
+import time
 from pathlib import Path
-from gtts import gTTS
-from manager import TourManager
-from agent import set_anthropic_client
+from manager import TourManager, SECTION_ORDER
+from agent import set_anthropic_client, run_sync, submit, response_cache, usage_summary
+from speech import StreamingSpeech, audio_duration, synthesize_chunked
+from cache import AudioStore
 
+# Shared store of synthesized tours; files are named by a hash of text and language
+audio_store = AudioStore(
+    os.environ.get("TOUR_AUDIO_DIR", Path(__file__).parent / "audio_cache"),
+    max_bytes=int(os.environ.get("TOUR_AUDIO_MAX_MB", "500")) * 1024 * 1024,
+)
+
+
+def tts(text: str, lang: str = "en", on_progress=None) -> Path:
+    """Convert text to speech using Google TTS (free, no API key required).
 
-def tts(text: str, lang: str = "en") -> Path:
-    """Convert text to speech using Google TTS (free, no API key required)."""
-    speech_file_path = Path(__file__).parent / "speech_tour.mp3"
-    tts_audio = gTTS(text=text, lang=lang, slow=False)
-    tts_audio.save(str(speech_file_path))
+    The text is synthesized in parallel chunks; ``on_progress`` receives
+    ``(chunks_done, chunks_total)`` as they finish. Audio for a text and
+    language that was synthesized before is reused from ``audio_store``.
+    """
+    speech_file_path = audio_store.get(text, lang)
+    if speech_file_path is None:
+        audio = synthesize_chunked(text, lang=lang, on_progress=on_progress)
+        speech_file_path = audio_store.put(text, lang, audio)
     return speech_file_path
 
 
 def run_async(func, *args, **kwargs):
-    """Helper to run async functions in Streamlit."""
+    """Helper to run async functions in Streamlit on the shared agent event loop."""
+    return run_sync(func, *args, **kwargs)
+
+
+def stream_tour(location: str, interests: list, duration: int, lang: str = "en", use_cache: bool = True):
+    """
+    Generate the tour with streaming agents, showing each section as it is
+    written and playing synthesized sentences as soon as they are ready.
+    Returns the tour text and its MP3 audio. The audio is None when it does
+    not match the tour text: a sentence failed to synthesize, or a section
+    that was streamed did not make it into the tour (e.g. it timed out).
+    """
+    events = queue.Queue()
+    sections = ["Introduction"] + [section for section in SECTION_ORDER if section in interests] + ["Conclusion"]
+    mgr = TourManager(use_cache=use_cache)
+    future = submit(
+        mgr.run, location, interests, duration,
+        on_event=lambda section, text: events.put((section, text)),
+    )
+    speech = StreamingSpeech(sections, lang=lang)
+
+    st.markdown("### 🎧 Listen to Your Tour")
+    player = st.empty()
+    with st.expander("📝 Tour Content", expanded=True):
+        placeholders = {section: st.empty() for section in sections}
+    texts = {section: "" for section in sections}
+
+    # Each batch of new sentences becomes its own clip, started when the
+    # previous one ends, so audio already sent is never sent again
+    clip_started = None
+    clip_length = 0.0
+    played = 0.0
+    pending = b""
     try:
-        return asyncio.run(func(*args, **kwargs))
-    except RuntimeError:
-        loop = asyncio.get_event_loop()
-        return loop.run_until_complete(func(*args, **kwargs))
+        while not (future.done() and events.empty() and speech.is_complete()):
+            try:
+                section, text = events.get(timeout=0.1)
+            except queue.Empty:
+                section = None
+            if section is not None:
+                if text is None:
+                    speech.finish(section)
+                else:
+                    texts[section] += text
+                    placeholders[section].markdown(texts[section])
+                    speech.feed(section, text)
+            if future.done() and events.empty():
+                # The run may have stopped before every section reported back
+                for pending_section in sections:
+                    speech.finish(pending_section)
+
+            pending += speech.new_audio()
+            now = time.monotonic()
+            if pending and (clip_started is None or now - clip_started >= clip_length):
+                played += clip_length
+                player.audio(pending, format="audio/mp3", autoplay=True)
+                clip_started, clip_length, pending = now, audio_duration(pending), b""
+
+        final_tour = future.result()
+        pending += speech.new_audio()
+        audio = speech.ready_audio()
+        if pending:
+            # Generation is over: hand over the whole tour once, at the listener's position
+            position = 0.0 if clip_started is None else played + time.monotonic() - clip_started
+            player.audio(audio, format="audio/mp3", start_time=int(position), autoplay=True)
+    finally:
+        speech.close()
+
+    streamed = "\n\n".join(texts[section] for section in sections if texts[section].strip())
+    if speech.failed_clips or streamed.split() != final_tour.split():
+        return final_tour, None
+    return final_tour, audio
 
 
 # Set page config for a better UI
@@ -73,6 +154,20 @@ with st.sidebar:
     st.markdown("---")
     st.markdown("### 🎙️ TTS Info")
     st.markdown("Using **Google TTS** (free, no API key needed)")
+    
+    use_cache = True
+    if response_cache is not None:
+        st.markdown("---")
+        st.markdown("### ⚡ Response Cache")
+        use_cache = st.toggle("Reuse cached responses", value=True, help="Serve repeat tours from the local cache")
+        stats = response_cache.stats()
+        st.caption(f"{stats['hits']} hits · {stats['misses']} misses")
+    
+    usage = usage_summary()
+    if usage["calls"]:
+        st.caption(
+            f"Tokens: {usage['input_tokens']:,} in · {usage['output_tokens']:,} out over {usage['calls']} calls"
+        )
 
 # Main content
 st.title("🎧 AI Audio Tour Agent")
@@ -129,6 +224,12 @@ with col2:
         }.get(x, x),
         help="Select the language for the audio tour"
     )
+    
+    stream_mode = st.toggle(
+        "⚡ Stream tour",
+        value=True,
+        help="Show each section as it is written and start playing audio within seconds"
+    )
 
 # Generate Tour Button
 if st.button("🎧 Generate Tour", type="primary"):
@@ -138,9 +239,22 @@ if st.button("🎧 Generate Tour", type="primary"):
         st.error("Please enter a location.")
     elif not interests:
         st.error("Please select at least one interest.")
+    elif stream_mode:
+        final_tour, tour_audio = stream_tour(location, interests, duration, lang=language, use_cache=use_cache)
+        if tour_audio is None:
+            with st.spinner("🎙️ Generating audio tour..."):
+                tour_audio = tts(final_tour, lang=language).read_bytes()
+        else:
+            audio_store.put(final_tour, language, tour_audio)
+        st.download_button(
+            label="📥 Download Audio Tour",
+            data=tour_audio,
+            file_name=f"{location.lower().replace(' ', '_')}_tour.mp3",
+            mime="audio/mp3"
+        )
     else:
         with st.spinner(f"🤖 Claude is creating your personalized tour of {location}..."):
-            mgr = TourManager()
+            mgr = TourManager(use_cache=use_cache)
             final_tour = run_async(
                 mgr.run, location, interests, duration
             )
@@ -152,7 +266,11 @@ if st.button("🎧 Generate Tour", type="primary"):
             # Add a progress bar for audio generation
             with st.spinner("🎙️ Generating audio tour..."):
                 progress_bar = st.progress(0)
-                tour_audio = tts(final_tour, lang=language)
+                tour_audio = tts(
+                    final_tour,
+                    lang=language,
+                    on_progress=lambda done, total: progress_bar.progress(done / total),
+                )
                 progress_bar.progress(100)
             
             # Display audio player with custom styling
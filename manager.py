@@ -1,60 +1,176 @@
 from __future__ import annotations
 
 import asyncio
+from typing import Callable, Optional
 from rich.console import Console
 
 from agent import (
-    History, Culture, Architecture, Culinary, Planner, FinalTour,
+    History, Culture, Architecture, Culinary, Planner, FinalTour, TourFrame,
     run_architecture_agent, run_culinary_agent, run_culture_agent,
-    run_history_agent, run_planner_agent, run_orchestrator_agent
+    run_history_agent, run_planner_agent, run_orchestrator_agent, plan_tour,
+    run_assembly_agent, run_introduction_agent, run_conclusion_agent, assemble_tour
 )
 from printer import Printer
 
+# Order in which the specialist sections appear in the tour
+SECTION_ORDER = ("Architecture", "History", "Culture", "Culinary")
+
+# Average speaking rate of the narration
+WORDS_PER_MINUTE = 150
+
+# Smallest section worth generating, in words
+MIN_SECTION_WORDS = 120
+
+# Output tokens per word of English narration, plus headroom for the upper word limit
+TOKENS_PER_WORD = 1.4
+MAX_TOKENS_HEADROOM = 1.25
+MIN_MAX_TOKENS = 256
+MAX_MAX_TOKENS = 8192
+
+# Longest section one call can write within MAX_MAX_TOKENS
+MAX_SECTION_WORDS = int(MAX_MAX_TOKENS / (TOKENS_PER_WORD * MAX_TOKENS_HEADROOM))
+
+# Slowest output rate an agent is allowed before it counts as stalled
+MIN_TOKENS_PER_SECOND = 25
+
+
+def word_budgets(planner: Planner, interests: list, duration) -> dict:
+    """
+    Turn the Planner's per-section minutes into word budgets for the selected
+    interests. The section minutes are rescaled so that together with the
+    planned introduction and conclusion they add up to the tour duration.
+    Every section gets at least ``MIN_SECTION_WORDS`` and at most
+    ``MAX_SECTION_WORDS``, which is all one call can write, so a long
+    single-interest tour comes out shorter instead of being cut off mid-sentence.
+    """
+    duration = float(duration)
+    minutes = {
+        interest: max(0.0, float(getattr(planner, interest.lower(), 0.0)))
+        for interest in interests
+        if interest in SECTION_ORDER
+    }
+    framing = max(0.0, planner.introduction) + max(0.0, planner.conclusion)
+    available = max(duration - framing, duration * 0.5)
+
+    planned = sum(minutes.values())
+    if planned <= 0:
+        # The plan gave nothing usable; fall back to an even split
+        minutes = {interest: 1.0 for interest in minutes}
+        planned = float(len(minutes))
+
+    return {
+        interest: min(
+            MAX_SECTION_WORDS,
+            max(MIN_SECTION_WORDS, int(available * share / planned * WORDS_PER_MINUTE)),
+        )
+        for interest, share in minutes.items()
+    }
+
+
+def framing_words(minutes: float) -> int:
+    """Word budget of the introduction or conclusion from its planned minutes."""
+    return max(MIN_SECTION_WORDS // 2, int(max(0.0, minutes) * WORDS_PER_MINUTE))
+
+
+def max_tokens_for(word_limit: int) -> int:
+    """Output token limit that fits ``word_limit`` words without leaving room for much more."""
+    tokens = int(word_limit * TOKENS_PER_WORD * MAX_TOKENS_HEADROOM)
+    return min(MAX_MAX_TOKENS, max(MIN_MAX_TOKENS, tokens))
+
 
 class TourManager:
     """
     Orchestrates the full tour generation flow using Claude-powered agents.
     """
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        agent_timeout: float = 120.0,
+        assembly_mode: bool = True,
+        use_llm_planner: bool = False,
+        use_cache: bool = True,
+    ) -> None:
         self.console = Console()
         self.printer = Printer(self.console)
+        # Upper bound on specialist agents talking to Claude at the same time
+        self.max_concurrency = max_concurrency
+        # Seconds a single agent may take, on top of the time it needs to write
+        # its max_tokens at MIN_TOKENS_PER_SECOND, before it is dropped
+        self.agent_timeout = agent_timeout
+        # Only generate the introduction, transitions and conclusion and splice
+        # them around the specialist sections locally, instead of having the
+        # orchestrator re-emit the whole tour
+        self.assembly_mode = assembly_mode
+        # Ask Claude for the time allocation instead of computing it locally
+        self.use_llm_planner = use_llm_planner
+        # Serve and store agent responses through the shared response cache
+        self.use_cache = use_cache
 
-    async def run(self, query: str, interests: list, duration: str) -> str:
+    async def run(
+        self,
+        query: str,
+        interests: list,
+        duration: str,
+        on_event: Optional[Callable[[str, Optional[str]], None]] = None,
+        weights: Optional[dict] = None,
+    ) -> str:
+        """
+        Generate the tour text. When ``on_event`` is given the tour is streamed:
+        it is called with ``(section, text)`` for every text delta and with
+        ``(section, None)`` once that section is finished. The introduction is
+        written alongside the specialist sections and the conclusion after
+        them, as the "Introduction" and "Conclusion" sections.
+        ``weights`` optionally biases the local planner per category.
+        """
         self.printer.update_item("start", "Starting tour research...", is_done=True)
         
         # Get plan based on selected interests
-        planner = await self._get_plan(query, interests, duration)
-        
-        # Initialize research results
-        research_results = {}
+        planner = await self._get_plan(query, interests, duration, weights)
         
-        # Calculate word limits based on duration
-        # Assuming average speaking rate of 150 words per minute
-        words_per_minute = 150
-        total_words = int(duration) * words_per_minute
-        words_per_section = total_words // len(interests)
+        # Calculate word limits from the planned minutes of each section
+        word_limits = word_budgets(planner, interests, duration)
         
-        # Only research selected interests
-        if "Architecture" in interests:
-            research_results["architecture"] = await self._get_architecture(query, interests, words_per_section)
+        # A streamed tour opens with its introduction while the sections are written
+        introduction = None
+        if on_event is not None:
+            introduction = asyncio.ensure_future(self._get_introduction(
+                query,
+                [interest for interest in SECTION_ORDER if interest in word_limits],
+                duration,
+                framing_words(planner.introduction),
+                on_event,
+            ))
         
-        if "History" in interests:
-            research_results["history"] = await self._get_history(query, interests, words_per_section)
+        # Research all selected interests concurrently
+        try:
+            research_results = await self._research(query, interests, word_limits, on_event)
+        except BaseException:
+            if introduction is not None:
+                introduction.cancel()
+            raise
         
-        if "Culinary" in interests:
-            research_results["culinary"] = await self._get_culinary(query, interests, words_per_section)
+        # Only keep the interests whose research succeeded, in tour order
+        interests = [
+            interest for interest in SECTION_ORDER
+            if interest in interests and interest.lower() in research_results
+        ]
         
-        if "Culture" in interests:
-            research_results["culture"] = await self._get_culture(query, interests, words_per_section)
-        
-        # Get final tour with only selected interests
-        final_tour = await self._get_final_tour(
-            query, 
-            interests, 
-            duration, 
-            research_results
-        )
+        if introduction is not None:
+            # Everything is streamed as it is written, so the sections stay untouched
+            conclusion = await self._get_conclusion(
+                query, interests, research_results, framing_words(planner.conclusion), on_event
+            )
+            frame = TourFrame(introduction=await introduction, conclusion=conclusion)
+            final_tour = assemble_tour(frame, interests, research_results)
+        else:
+            # Get final tour with only selected interests
+            final_tour = await self._get_final_tour(
+                query, 
+                interests, 
+                duration, 
+                research_results
+            )
         
         self.printer.update_item("final_report", "", is_done=True)
         self.printer.end()
@@ -84,9 +200,149 @@ class TourManager:
         final = "\n\n".join(sections)
         return final
         
-    async def _get_plan(self, query: str, interests: list, duration: str) -> Planner:
+    def timeout_for(self, max_tokens: int) -> float:
+        """Seconds an agent writing up to ``max_tokens`` may take before it is dropped."""
+        return self.agent_timeout + max_tokens / MIN_TOKENS_PER_SECOND
+
+    async def _research(
+        self,
+        query: str,
+        interests: list,
+        word_limits: dict,
+        on_event: Optional[Callable[[str, Optional[str]], None]] = None,
+    ) -> dict:
+        """
+        Fan out every selected specialist at once and collect the sections that
+        succeed. A specialist that fails or times out is reported and skipped so
+        the tour can still be built from the remaining sections.
+        """
+        specialists = {
+            "Architecture": self._get_architecture,
+            "History": self._get_history,
+            "Culture": self._get_culture,
+            "Culinary": self._get_culinary,
+        }
+        selected = [interest for interest in interests if interest in word_limits]
+        semaphore = asyncio.Semaphore(max(1, self.max_concurrency))
+
+        async def run_specialist(interest: str):
+            on_text = None
+            if on_event is not None:
+                on_text = lambda text: on_event(interest, text)
+            try:
+                async with semaphore:
+                    return await asyncio.wait_for(
+                        specialists[interest](
+                            query,
+                            interests,
+                            word_limits[interest],
+                            max_tokens=max_tokens_for(word_limits[interest]),
+                            on_text=on_text,
+                        ),
+                        timeout=self.timeout_for(max_tokens_for(word_limits[interest])),
+                    )
+            finally:
+                if on_event is not None:
+                    on_event(interest, None)
+
+        results = await asyncio.gather(
+            *(run_specialist(interest) for interest in selected),
+            return_exceptions=True,
+        )
+
+        research_results = {}
+        for interest, result in zip(selected, results):
+            if isinstance(result, BaseException):
+                reason = "timed out" if isinstance(result, asyncio.TimeoutError) else str(result)
+                self.printer.update_item(
+                    interest,
+                    f"Skipped {interest.lower()} research ({reason})",
+                    is_done=True,
+                    hide_checkmark=True,
+                )
+                continue
+            research_results[interest.lower()] = result
+
+        if not research_results:
+            raise RuntimeError("All specialist agents failed; no tour content was produced.")
+        return research_results
+
+    async def _get_introduction(
+        self,
+        query: str,
+        interests: list,
+        duration: str,
+        word_limit: int,
+        on_event: Callable[[str, Optional[str]], None],
+    ) -> str:
+        """Stream the introduction; a failure leaves the tour without one."""
+        max_tokens = max_tokens_for(word_limit)
+        return await self._stream_framing(
+            "Introduction",
+            "Writing the introduction...",
+            run_introduction_agent(
+                query, interests, duration, word_limit,
+                on_text=lambda text: on_event("Introduction", text),
+                max_tokens=max_tokens,
+                use_cache=self.use_cache,
+            ),
+            self.timeout_for(max_tokens),
+            on_event,
+        )
+
+    async def _get_conclusion(
+        self,
+        query: str,
+        interests: list,
+        research_results: dict,
+        word_limit: int,
+        on_event: Callable[[str, Optional[str]], None],
+    ) -> str:
+        """Stream the conclusion; a failure leaves the tour without one."""
+        max_tokens = max_tokens_for(word_limit)
+        return await self._stream_framing(
+            "Conclusion",
+            "Writing the conclusion...",
+            run_conclusion_agent(
+                query, interests, research_results, word_limit,
+                on_text=lambda text: on_event("Conclusion", text),
+                max_tokens=max_tokens,
+                use_cache=self.use_cache,
+            ),
+            self.timeout_for(max_tokens),
+            on_event,
+        )
+
+    async def _stream_framing(
+        self,
+        section: str,
+        status: str,
+        agent,
+        timeout: float,
+        on_event: Callable[[str, Optional[str]], None],
+    ) -> str:
+        self.printer.update_item(section, status)
+        try:
+            text = await asyncio.wait_for(agent, timeout=timeout)
+        except Exception as e:
+            reason = "timed out" if isinstance(e, asyncio.TimeoutError) else str(e)
+            self.printer.update_item(
+                section, f"Skipped the {section.lower()} ({reason})", is_done=True, hide_checkmark=True
+            )
+            return ""
+        finally:
+            on_event(section, None)
+        self.printer.update_item(section, f"Completed the {section.lower()}", is_done=True)
+        return text
+
+    async def _get_plan(
+        self, query: str, interests: list, duration: str, weights: Optional[dict] = None
+    ) -> Planner:
         self.printer.update_item("Planner", "Planning your personalized tour...")
-        result = await run_planner_agent(query, interests, duration)
+        if self.use_llm_planner:
+            result = await run_planner_agent(query, interests, duration, use_cache=self.use_cache)
+        else:
+            result = plan_tour(interests, duration, weights)
         self.printer.update_item(
             "Planner",
             "Completed planning",
@@ -94,9 +350,18 @@ class TourManager:
         )
         return result
     
-    async def _get_history(self, query: str, interests: list, word_limit: int) -> History:
+    async def _get_history(
+        self,
+        query: str,
+        interests: list,
+        word_limit: int,
+        max_tokens: int = 2048,
+        on_text: Optional[Callable[[str], None]] = None,
+    ) -> History:
         self.printer.update_item("History", "Researching historical highlights...")
-        result = await run_history_agent(query, interests, word_limit)
+        result = await run_history_agent(
+            query, interests, word_limit, on_text, max_tokens=max_tokens, use_cache=self.use_cache
+        )
         self.printer.update_item(
             "History",
             "Completed history research",
@@ -104,9 +369,18 @@ class TourManager:
         )
         return result
 
-    async def _get_architecture(self, query: str, interests: list, word_limit: int) -> Architecture:
+    async def _get_architecture(
+        self,
+        query: str,
+        interests: list,
+        word_limit: int,
+        max_tokens: int = 2048,
+        on_text: Optional[Callable[[str], None]] = None,
+    ) -> Architecture:
         self.printer.update_item("Architecture", "Exploring architectural wonders...")
-        result = await run_architecture_agent(query, interests, word_limit)
+        result = await run_architecture_agent(
+            query, interests, word_limit, on_text, max_tokens=max_tokens, use_cache=self.use_cache
+        )
         self.printer.update_item(
             "Architecture",
             "Completed architecture research",
@@ -114,9 +388,18 @@ class TourManager:
         )
         return result
     
-    async def _get_culinary(self, query: str, interests: list, word_limit: int) -> Culinary:
+    async def _get_culinary(
+        self,
+        query: str,
+        interests: list,
+        word_limit: int,
+        max_tokens: int = 2048,
+        on_text: Optional[Callable[[str], None]] = None,
+    ) -> Culinary:
         self.printer.update_item("Culinary", "Discovering local flavors...")
-        result = await run_culinary_agent(query, interests, word_limit)
+        result = await run_culinary_agent(
+            query, interests, word_limit, on_text, max_tokens=max_tokens, use_cache=self.use_cache
+        )
         self.printer.update_item(
             "Culinary",
             "Completed culinary research",
@@ -124,9 +407,18 @@ class TourManager:
         )
         return result
     
-    async def _get_culture(self, query: str, interests: list, word_limit: int) -> Culture:
+    async def _get_culture(
+        self,
+        query: str,
+        interests: list,
+        word_limit: int,
+        max_tokens: int = 2048,
+        on_text: Optional[Callable[[str], None]] = None,
+    ) -> Culture:
         self.printer.update_item("Culture", "Exploring cultural highlights...")
-        result = await run_culture_agent(query, interests, word_limit)
+        result = await run_culture_agent(
+            query, interests, word_limit, on_text, max_tokens=max_tokens, use_cache=self.use_cache
+        )
         self.printer.update_item(
             "Culture",
             "Completed culture research",
@@ -136,7 +428,27 @@ class TourManager:
     
     async def _get_final_tour(self, query: str, interests: list, duration: float, research_results: dict) -> FinalTour:
         self.printer.update_item("Final Tour", "Creating your personalized tour...")
-        result = await run_orchestrator_agent(query, interests, duration, research_results)
+        if self.assembly_mode:
+            try:
+                frame = await run_assembly_agent(
+                    query, interests, duration, research_results, use_cache=self.use_cache
+                )
+            except ValueError as e:
+                # Keep the finished sections rather than losing the whole tour
+                self.printer.update_item(
+                    "Final Tour",
+                    f"Skipped the introduction and conclusion ({e})",
+                    is_done=True,
+                    hide_checkmark=True,
+                )
+                return assemble_tour(
+                    TourFrame(introduction="", transitions={}, conclusion=""), interests, research_results
+                )
+            result = assemble_tour(frame, interests, research_results)
+        else:
+            result = await run_orchestrator_agent(
+                query, interests, duration, research_results, use_cache=self.use_cache
+            )
         self.printer.update_item(
             "Final Tour",
             "Completed Final Tour Guide Creation",
@@ -0,0 +1,72 @@
+from typing import Optional, Tuple
+
+import numpy as np
+import speech_recognition as sr
+
+# Recognizers work on 16 kHz, 16-bit mono PCM
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+
+# Voice activity detection: frame length, speech kept either side of the
+# detected speech, and how loud a frame must be relative to the clip's noise
+# floor (and never quieter than MIN_RMS, about -50 dBFS) to count as speech
+FRAME_MS = 20
+PADDING_MS = 200
+NOISE_FACTOR = 3.0
+MIN_RMS = 100.0
+
+
+def normalize(audio: sr.AudioData) -> sr.AudioData:
+    """Resample to 16 kHz, 16-bit PCM (``sr.AudioFile`` already mixes down to mono)."""
+    if audio.sample_rate == SAMPLE_RATE and audio.sample_width == SAMPLE_WIDTH:
+        return audio
+    pcm = audio.get_raw_data(convert_rate=SAMPLE_RATE, convert_width=SAMPLE_WIDTH)
+    return sr.AudioData(pcm, SAMPLE_RATE, SAMPLE_WIDTH)
+
+
+def speech_bounds(samples: np.ndarray, sample_rate: int = SAMPLE_RATE) -> Optional[Tuple[int, int]]:
+    """
+    Sample range ``[start, end)`` that holds the speech in ``samples``, padded
+    by ``PADDING_MS``, or None if the clip is silent.
+
+    Frames are compared by RMS energy against a threshold derived from the
+    quietest tenth of the clip, so it adapts to road noise; it is capped
+    relative to the loudest frame so a clip with no pauses is left whole.
+    """
+    frame = sample_rate * FRAME_MS // 1000
+    count = len(samples) // frame
+    if count == 0:
+        return None
+    frames = samples[:count * frame].reshape(count, frame).astype(np.float32)
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    noise_floor = np.percentile(rms, 10)
+    threshold = max(MIN_RMS, min(NOISE_FACTOR * noise_floor, 0.1 * rms.max()))
+
+    voiced = np.flatnonzero(rms > threshold)
+    if voiced.size == 0:
+        return None
+    padding = PADDING_MS // FRAME_MS
+    start = max(voiced[0] - padding, 0) * frame
+    end = min((voiced[-1] + 1 + padding) * frame, len(samples))
+    return start, end
+
+
+def trim_silence(audio: sr.AudioData) -> Optional[sr.AudioData]:
+    """Cut leading and trailing silence from 16-bit PCM audio; None if there is no speech."""
+    samples = np.frombuffer(audio.get_raw_data(), dtype=np.int16)
+    bounds = speech_bounds(samples, audio.sample_rate)
+    if bounds is None:
+        return None
+    start, end = bounds
+    return sr.AudioData(samples[start:end].tobytes(), audio.sample_rate, audio.sample_width)
+
+
+def duration(audio: sr.AudioData) -> float:
+    return len(audio.frame_data) / (audio.sample_rate * audio.sample_width)
+
+
+def prepare(audio: sr.AudioData, trim: bool = True) -> Optional[sr.AudioData]:
+    """Normalize a recorded clip to 16 kHz mono and trim the silence around the speech."""
+    audio = normalize(audio)
+    return trim_silence(audio) if trim else audio
+
@@ -0,0 +1,64 @@
+"""
+Microbenchmark for the distance helpers in geo.py.
+
+Compares a pure-Python loop over the scalar haversine (how distances used to
+be computed, one call per place) with the vectorized haversine and the
+equirectangular approximation on 10k and 1M random destinations.
+
+    python bench_distance.py
+"""
+import time
+from math import radians, sin, cos, sqrt, atan2
+
+import numpy as np
+
+from geo import EARTH_RADIUS_MILES, distance_matrix, equirectangular_many, haversine_many
+
+
+def scalar_haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
+    a = sin((lat2 - lat1) / 2)**2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2)**2
+    return EARTH_RADIUS_MILES * 2 * atan2(sqrt(a), sqrt(1 - a))
+
+
+def best_of(func, repeat: int = 3) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    rng = np.random.default_rng(0)
+    origin_lat, origin_lon = 37.7749, -122.4194
+    for n in (10_000, 1_000_000):
+        # Destinations within about 30 miles of the origin
+        lats = origin_lat + rng.uniform(-0.5, 0.5, n)
+        lons = origin_lon + rng.uniform(-0.5, 0.5, n)
+        lat_list, lon_list = lats.tolist(), lons.tolist()
+
+        loop = best_of(lambda: [scalar_haversine(origin_lat, origin_lon, a, b) for a, b in zip(lat_list, lon_list)], 1)
+        vectorized = best_of(lambda: haversine_many(origin_lat, origin_lon, lats, lons))
+        approximate = best_of(lambda: equirectangular_many(origin_lat, origin_lon, lats, lons))
+        error = np.max(np.abs(
+            equirectangular_many(origin_lat, origin_lon, lats, lons) - haversine_many(origin_lat, origin_lon, lats, lons)
+        ))
+
+        print(f"{n:>9,} points")
+        print(f"  scalar loop      {loop * 1000:9.2f} ms")
+        print(f"  haversine_many   {vectorized * 1000:9.2f} ms  ({loop / vectorized:6.1f}x)")
+        print(f"  equirectangular  {approximate * 1000:9.2f} ms  ({loop / approximate:6.1f}x, max error {error * 5280:.1f} ft)")
+
+    sources = 1_000
+    lats1 = origin_lat + rng.uniform(-0.5, 0.5, sources)
+    lons1 = origin_lon + rng.uniform(-0.5, 0.5, sources)
+    lats2 = origin_lat + rng.uniform(-0.5, 0.5, sources)
+    lons2 = origin_lon + rng.uniform(-0.5, 0.5, sources)
+    matrix = best_of(lambda: distance_matrix(lats1, lons1, lats2, lons2))
+    print(f"{sources:,} x {sources:,} distance_matrix  {matrix * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
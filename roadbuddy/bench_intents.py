@@ -0,0 +1,134 @@
+"""
+Microbenchmark for the intent router in intents.py.
+
+Routes a corpus of labelled utterances with the old substring if/elif chain
+(as it was in the voice path) and with IntentRouter, reporting accuracy and
+time per utterance, and checks the distances the router parses. Then pads the router with thousands of synthetic
+keywords to show that routing time stays flat as keywords grow.
+
+    python bench_intents.py
+"""
+import random
+import string
+import time
+from typing import Dict, List, Optional, Tuple
+
+from intents import INTENT_KEYWORDS, IntentRouter, parse_radius
+
+# (utterance, expected place type or None)
+CORPUS: List[Tuple[str, Optional[str]]] = [
+    ("Is there a coffee shop nearby?", "coffee"),
+    ("I could really use some caffeine", "coffee"),
+    ("Find me a Starbucks within 2 miles", "coffee"),
+    ("Where can I get a latte", "coffee"),
+    ("Any good restaurants around here?", "restaurant"),
+    ("I'm starving, let's get lunch", "restaurant"),
+    ("Somewhere to eat breakfast", "restaurant"),
+    ("Find a restaurant half a mile ahead", "restaurant"),
+    ("We need gas soon", "gas"),
+    ("Where's the nearest fuel station", "gas"),
+    ("I need to fill up the tank", "gas"),
+    ("Diesel within 10 miles?", "gas"),
+    ("Is there a rest area coming up", "rest_area"),
+    ("I need a bathroom break", "rest_area"),
+    ("Let's find a rest stop", "rest_area"),
+    ("Where can I park the car", "parking"),
+    ("Find parking near downtown", "parking"),
+    ("Nearest hospital please", "hospital"),
+    ("Is there urgent care around", "hospital"),
+    ("I need a pharmacy", "pharmacy"),
+    ("Is there a CVS nearby", "pharmacy"),
+    ("Find a motel for tonight", "hotel"),
+    ("We need a place to stay", "hotel"),
+    ("Where's an ATM", "atm"),
+    ("I need to get cash", "atm"),
+    ("Is there a grocery store close by", "supermarket"),
+    ("We should buy groceries", "supermarket"),
+    ("Let's play a game", None),
+    ("That was a great song", None),
+    ("Tell me something interesting about this area", None),
+    ("What does a yellow diamond sign mean?", None),
+    ("I'm feeling a bit tired", None),
+    ("Interesting restaurant review I read", "restaurant"),
+    ("The weather is great today", None),
+    ("What's our target arrival time?", None),
+    ("We should visit the national park", None),
+    ("I need a break from this song", None),
+    ("Where can I find an EV charger", None),
+    ("Any gas within a mile and a half?", "gas"),
+    ("Is there a parking garage downtown", "parking"),
+    ("I need to stretch my legs", "rest_area"),
+]
+
+# (utterance, expected radius in meters or None)
+RADIUS_CORPUS: List[Tuple[str, Optional[int]]] = [
+    ("Find me a Starbucks within 2 miles", 3218),
+    ("Find a restaurant half a mile ahead", 804),
+    ("Any gas within a mile and a half?", 2414),
+    ("Two and a half miles at most", 4023),
+    ("Diesel within 10 miles?", 16093),
+    ("Coffee within 3 km", 3000),
+    ("We need gas soon", None),
+    ("Run 5k, then coffee within 500m", 5000),
+    ("I am hungry", None),
+    ("I am low on gas", None),
+    ("I am so tired, rest area please", None),
+    ("Is there coffee open at 7 am", None),
+]
+
+
+def substring_chain(text: str) -> Optional[str]:
+    user_lower = text.lower()
+    if any(word in user_lower for word in ["coffee", "cafe", "starbucks", "caffeine"]):
+        return "coffee"
+    elif any(word in user_lower for word in ["food", "restaurant", "eat", "hungry", "lunch", "dinner", "breakfast"]):
+        return "restaurant"
+    elif any(word in user_lower for word in ["gas", "fuel", "petrol", "fill up"]):
+        return "gas"
+    elif any(word in user_lower for word in ["rest", "stop", "break", "parking"]):
+        return "rest_area"
+    return None
+
+
+def padded_keywords(extra: int) -> Dict[str, Dict[str, float]]:
+    rng = random.Random(0)
+    keywords = {category: dict(words) for category, words in INTENT_KEYWORDS.items()}
+    categories = list(keywords)
+    for _ in range(extra):
+        word = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 12)))
+        keywords[rng.choice(categories)][word] = 0.7
+    return keywords
+
+
+def per_utterance(route, utterances: List[str], repeat: int = 200) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in utterances:
+            route(text)
+    return (time.perf_counter() - start) / (repeat * len(utterances))
+
+
+def main() -> None:
+    utterances = [text for text, _ in CORPUS]
+    router = IntentRouter()
+
+    def routed(text: str) -> Optional[str]:
+        intent = router.route(text)
+        return intent.category if intent else None
+
+    for name, route in (("substring chain", substring_chain), ("IntentRouter", routed)):
+        correct = sum(route(text) == expected for text, expected in CORPUS)
+        print(f"{name:<16} {correct:>2}/{len(CORPUS)} correct  {per_utterance(route, utterances) * 1e6:7.2f} us/utterance")
+
+    parsed = sum(parse_radius(text) == expected for text, expected in RADIUS_CORPUS)
+    print(f"{'parse_radius':<16} {parsed:>2}/{len(RADIUS_CORPUS)} correct")
+
+    keyword_count = sum(len(words) for words in INTENT_KEYWORDS.values())
+    for extra in (0, 1_000, 10_000):
+        padded = IntentRouter(padded_keywords(extra))
+        timing = per_utterance(padded.route, utterances)
+        print(f"{keyword_count + extra:>7,} keywords  {timing * 1e6:7.2f} us/utterance")
+
+
+if __name__ == "__main__":
+    main()
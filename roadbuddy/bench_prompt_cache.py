@@ -0,0 +1,104 @@
+"""
+Check that RoadBuddy's conversation prefix is read back from the prompt cache.
+
+Plays a scripted drive through build_context and with_cache_breakpoints
+against the Messages API and prints the cache reads and writes of every turn.
+Whenever two consecutive turns send the same prefix (no batch was folded into
+the summary in between) and the first one was cached, the second must report
+cache_read_input_tokens > 0; otherwise the check fails. The system prompt is
+read from roadbuddy.py (which cannot be imported outside Streamlit), and
+replies are allowed to run longer than in the app so the prefix passes the
+cacheable minimum within a few turns.
+
+    ANTHROPIC_API_KEY=... python bench_prompt_cache.py
+"""
+import ast
+import os
+import sys
+
+from anthropic import Anthropic
+
+from context import build_context, with_cache_breakpoints
+
+MODEL = "claude-sonnet-4-20250514"
+
+
+def load_system_prompt() -> str:
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "roadbuddy.py")
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(
+            isinstance(target, ast.Name) and target.id == "ROADBUDDY_SYSTEM" for target in node.targets
+        ):
+            return ast.literal_eval(node.value)
+    raise RuntimeError("ROADBUDDY_SYSTEM not found in roadbuddy.py")
+
+
+DRIVE = [
+    "Hey, we just got on the highway. Tell me something about long road trips.",
+    "How did the interstate highway system come about?",
+    "Why are highway signs green?",
+    "What does a yellow diamond road sign mean?",
+    "I'm feeling a bit tired, what can I do about it while driving?",
+    "Tell me something interesting about bridges.",
+    "How do suspension bridges stay up in strong wind?",
+    "What was the longest bridge ever built?",
+    "How were roads built before there were machines?",
+    "Why do some roads have rumble strips?",
+    "Let's talk about music. What makes a good driving song?",
+    "Why do people like singing in the car so much?",
+    "How do cars stay cool in hot weather?",
+    "What's the story behind Route 66?",
+    "How do traffic lights know when to change?",
+    "Why does the road sometimes look wet in the distance on a hot day?",
+    "What are some good habits for driving at night?",
+    "Tell me about the history of gas stations.",
+]
+
+
+def main() -> int:
+    client = Anthropic(max_retries=8)
+    # Longer replies than in the app, so the prefix reaches the cacheable minimum
+    system_prompt = load_system_prompt() + "\nFor this check, ignore the length rules above and answer every question in at least 350 words."
+    history: list = []
+    summarized, summary = 0, ""
+    previous = None
+    checked = failed = 0
+
+    print(f"{'turn':>4} {'folded':>8} {'breakpoint':>10} {'input':>8} {'written':>8} {'read':>8}")
+    for turn, text in enumerate(DRIVE, 1):
+        history.append({"role": "user", "content": f"{text}\n[User's location: Interstate 5, Oregon]"})
+        messages, summarized, summary = build_context(history, summarized, summary)
+        system, messages = with_cache_breakpoints(system_prompt, messages, summary)
+        response = client.messages.create(model=MODEL, max_tokens=800, system=system, messages=messages)
+        history.append({"role": "assistant", "content": response.content[0].text})
+
+        usage = response.usage
+        written = usage.cache_creation_input_tokens or 0
+        read = usage.cache_read_input_tokens or 0
+        # The prefix a turn shares with the next one: summary and window start
+        prefix = (summarized, summary)
+
+        status = ""
+        if previous is not None and previous[0] == prefix and previous[1]:
+            checked += 1
+            if read == 0:
+                failed += 1
+                status = "  MISS: same prefix as the previous turn but nothing read"
+        breakpoint_set = any(isinstance(message["content"], list) for message in messages)
+        print(
+            f"{turn:>4} {summarized:>8} {'yes' if breakpoint_set else 'no':>10} "
+            f"{usage.input_tokens:>8,} {written:>8,} {read:>8,}{status}"
+        )
+        previous = (prefix, written > 0 or read > 0)
+
+    if checked == 0:
+        print("No turn was cached (the prefix never reached the cacheable length); nothing was checked.")
+        return 1
+    print(f"{checked - failed}/{checked} turns read the previous turn's prefix from the cache")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+import re
+from typing import List, Tuple
+
+# Most recent messages sent verbatim (user and assistant turns together)
+MAX_WINDOW_MESSAGES = 12
+
+# Older turns are folded into the summary this many messages at a time, so
+# the summary and the start of the window (the prompt-cache prefix) only
+# change every few turns instead of on every turn once the window is full
+FOLD_BATCH_MESSAGES = 6
+
+# Shortest prefix that comes back from the prompt cache; a breakpoint on less
+# is ignored. The documented minimum for Sonnet is 1024 tokens, but nothing
+# shorter than 2048 was cached when measured with bench_prompt_cache.py
+MIN_CACHEABLE_TOKENS = 2048
+
+# Budget for the window plus the running summary, in estimated tokens
+MAX_CONTEXT_TOKENS = 2500
+
+# Length limits for the running summary of older turns
+MAX_SUMMARY_CHARS = 1500
+MAX_SUMMARY_LINE_CHARS = 140
+
+_PLACES_BLOCK = re.compile(r"\s*\[Nearby places data:.*\]\s*$", re.DOTALL)
+_LOCATION_BLOCK = re.compile(r"\s*\[User's location:[^\]]*\]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for English text (about four characters per token)."""
+    return len(text) // 4 + 1
+
+
+def strip_context(content: str) -> str:
+    """Remove the location and nearby-places blocks attached to a user turn."""
+    content = _PLACES_BLOCK.sub("", content)
+    return _LOCATION_BLOCK.sub("", content).strip()
+
+
+def _summary_line(message: dict) -> str:
+    speaker = "Driver" if message["role"] == "user" else "You"
+    text = " ".join(strip_context(message["content"]).split())
+    if len(text) > MAX_SUMMARY_LINE_CHARS:
+        text = text[:MAX_SUMMARY_LINE_CHARS - 3].rstrip() + "..."
+    return f"{speaker}: {text}"
+
+
+def _fold(summary: str, messages: List[dict]) -> str:
+    lines = [summary] if summary else []
+    lines.extend(_summary_line(message) for message in messages)
+    summary = "\n".join(lines)
+    if len(summary) > MAX_SUMMARY_CHARS:
+        # Keep the most recent part, starting at a line boundary
+        summary = summary[-MAX_SUMMARY_CHARS:]
+        summary = summary[summary.find("\n") + 1:]
+    return summary
+
+
+def build_context(history: List[dict], summarized: int, summary: str) -> Tuple[List[dict], int, str]:
+    """
+    Select what to send to Claude for the latest turn of ``history``.
+
+    Returns the messages to send, plus the updated ``summarized`` count and
+    ``summary`` to keep for the next turn. The first ``summarized`` messages of
+    ``history`` are already folded into ``summary``. Older turns beyond the
+    window or the token budget are folded into it as well, ``FOLD_BATCH_MESSAGES``
+    at a time. Only the latest user turn keeps its location and nearby-places
+    blocks. Each call does a bounded amount of work regardless of how long the
+    drive has been.
+    """
+    start = summarized
+    while len(history) - start > MAX_WINDOW_MESSAGES:
+        start += FOLD_BATCH_MESSAGES
+    # The window must start with a user turn
+    if start < len(history) and history[start]["role"] != "user":
+        start += 1
+    if start > summarized:
+        summary = _fold(summary, history[summarized:start])
+
+    window = [
+        {"role": message["role"], "content": strip_context(message["content"])}
+        for message in history[start:-1]
+    ]
+    window.append(dict(history[-1]))
+
+    tokens = estimate_tokens(summary) + sum(estimate_tokens(message["content"]) for message in window)
+    while tokens > MAX_CONTEXT_TOKENS and len(window) > 2:
+        # Fold the oldest user/assistant exchanges into the summary
+        count = min(FOLD_BATCH_MESSAGES, (len(window) - 1) // 2 * 2)
+        folded, window = window[:count], window[count:]
+        tokens -= sum(estimate_tokens(message["content"]) for message in folded)
+        tokens -= estimate_tokens(summary)
+        summary = _fold(summary, folded)
+        tokens += estimate_tokens(summary)
+        start += count
+
+    return window, start, summary
+
+
+def with_cache_breakpoints(system_prompt: str, messages: List[dict], summary: str = "") -> Tuple[list, List[dict]]:
+    """
+    Build the system blocks and messages for a turn, with a prompt-cache
+    breakpoint at the end of the conversation prefix (everything before the
+    new user turn). That prefix repeats verbatim on the next turn unless
+    ``build_context`` folds a batch into the summary. No breakpoint is set
+    while the prefix is shorter than ``MIN_CACHEABLE_TOKENS``, since the API
+    would not cache it.
+    """
+    system = [{"type": "text", "text": system_prompt}]
+    if summary:
+        system.append({"type": "text", "text": f"EARLIER IN THIS DRIVE:\n{summary}"})
+
+    messages = list(messages)
+    prefix_tokens = estimate_tokens(system_prompt) + (estimate_tokens(summary) if summary else 0)
+    prefix_tokens += sum(estimate_tokens(message["content"]) for message in messages[:-1])
+    if len(messages) > 1 and prefix_tokens >= MIN_CACHEABLE_TOKENS:
+        prefix_end = messages[-2]
+        messages[-2] = {
+            "role": prefix_end["role"],
+            "content": [{"type": "text", "text": prefix_end["content"], "cache_control": {"type": "ephemeral"}}],
+        }
+    return system, messages
@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from geo import calculate_distance, geohash_encode
+from places import TokenBucket
+
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/reverse"
+
+
+def format_address(data: dict) -> str:
+    """Turn a Nominatim reverse-geocoding response into a short place name."""
+    address = data.get("address", {})
+    city = address.get("city") or address.get("town") or address.get("village") or address.get("county", "")
+    state = address.get("state", "")
+    country = address.get("country", "")
+
+    if city and state:
+        return f"{city}, {state}"
+    elif city and country:
+        return f"{city}, {country}"
+    elif state:
+        return state
+    else:
+        return data.get("display_name", "Unknown location")[:50]
+
+
+class ReverseGeocoder:
+    """
+    Nominatim reverse geocoder with an LRU cache keyed on geohash cells.
+
+    ``locate`` only re-resolves the name once the user has moved more than
+    ``refresh_miles`` from the last resolved fix or ``ttl`` seconds have passed,
+    so Streamlit reruns cost nothing. All requests share one pooled session and
+    are limited to one per second, as Nominatim's usage policy requires.
+    """
+
+    def __init__(
+        self,
+        url: str = NOMINATIM_URL,
+        precision: int = 6,
+        refresh_miles: float = 1.0,
+        ttl: float = 30 * 60,
+        max_entries: int = 256,
+        timeout: float = 5,
+    ) -> None:
+        self.url = url
+        self.precision = precision
+        self.refresh_miles = refresh_miles
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.rate_limiter = TokenBucket(rate=1.0, capacity=1)
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = "RoadBuddy/1.0"
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self._cache: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def locate(self, lat: float, lon: float, last: Optional[dict] = None) -> dict:
+        """
+        Return the fix ``{"lat", "lon", "name", "time"}`` for the current
+        position. ``last`` is the fix returned previously for this user; it is
+        reused as long as the user is still close to it and it is fresh.
+        """
+        now = time.time()
+        if (
+            last is not None
+            and last.get("name")
+            and now - last["time"] <= self.ttl
+            and calculate_distance(lat, lon, last["lat"], last["lon"]) <= self.refresh_miles
+        ):
+            return last
+
+        name = self.lookup(lat, lon)
+        if name is None and last is not None:
+            # Keep showing the previous name rather than nothing, but leave its
+            # position and time alone so the next fix tries again
+            return last
+        return {"lat": lat, "lon": lon, "name": name, "time": now}
+
+    def lookup(self, lat: float, lon: float) -> Optional[str]:
+        """Reverse geocode coordinates to get location name, from the cache when possible."""
+        cell = geohash_encode(lat, lon, self.precision)
+        with self._lock:
+            entry = self._cache.get(cell)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl:
+                self._cache.move_to_end(cell)
+                return entry[1]
+
+        if not self.rate_limiter.acquire(timeout=1.0):
+            return entry[1] if entry is not None else None
+        try:
+            response = self.session.get(
+                self.url,
+                params={"lat": lat, "lon": lon, "format": "json"},
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            name = format_address(response.json())
+        except (requests.RequestException, ValueError):
+            return entry[1] if entry is not None else None
+
+        with self._lock:
+            self._cache[cell] = (time.monotonic(), name)
+            self._cache.move_to_end(cell)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return name
@@ -0,0 +1,177 @@
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from geo import METERS_PER_MILE
+
+# Keywords per place type with how sure a match makes us (0-1). Multi-word
+# phrases are written with single spaces; matching is on whole words only.
+# Words that often mean something else ("park", "break", "target") weigh
+# less than MIN_CONFIDENCE, so they only count with another keyword's support.
+INTENT_KEYWORDS: Dict[str, Dict[str, float]] = {
+    "coffee": {
+        "coffee": 1.0, "cafe": 1.0, "café": 1.0, "starbucks": 1.0, "caffeine": 0.9,
+        "espresso": 1.0, "latte": 1.0, "cappuccino": 1.0, "dunkin": 1.0,
+    },
+    "restaurant": {
+        "restaurant": 1.0, "restaurants": 1.0, "food": 0.9, "eat": 0.8, "hungry": 0.9,
+        "lunch": 0.9, "dinner": 0.9, "breakfast": 0.9, "brunch": 0.9, "something to eat": 1.0,
+        "burger": 0.8, "pizza": 0.8, "tacos": 0.8, "diner": 0.9, "drive through": 0.8, "drive thru": 0.8,
+    },
+    "gas": {
+        "gas": 0.9, "gas station": 1.0, "fuel": 1.0, "petrol": 1.0, "fill up": 0.9, "diesel": 1.0,
+        "refuel": 1.0, "running on empty": 1.0, "low on gas": 1.0,
+    },
+    "rest_area": {
+        "rest area": 1.0, "rest stop": 1.0, "rest": 0.4, "break": 0.4, "stretch": 0.4,
+        "stretch my legs": 0.9, "stretch our legs": 0.9,
+        "bathroom": 0.8, "restroom": 0.9, "toilet": 0.8, "pull over": 0.7, "stop": 0.4,
+    },
+    "parking": {
+        "parking": 1.0, "park": 0.4, "place to park": 1.0, "park the car": 1.0, "parking lot": 1.0,
+        "garage": 0.4, "parking garage": 1.0,
+    },
+    "hospital": {
+        "hospital": 1.0, "emergency room": 1.0, "urgent care": 1.0, "emergency": 0.8, "doctor": 0.7,
+    },
+    "pharmacy": {
+        "pharmacy": 1.0, "drugstore": 1.0, "drug store": 1.0, "chemist": 0.9, "medicine": 0.8,
+        "cvs": 1.0, "walgreens": 1.0, "prescription": 0.9,
+    },
+    "hotel": {
+        "hotel": 1.0, "motel": 1.0, "inn": 0.4, "holiday inn": 1.0, "lodging": 1.0, "place to stay": 1.0,
+        "somewhere to sleep": 1.0, "stay the night": 1.0,
+    },
+    "atm": {
+        "atm": 1.0, "cash": 0.8, "cash machine": 1.0, "withdraw": 0.8, "bank": 0.4,
+    },
+    "supermarket": {
+        "supermarket": 1.0, "grocery": 1.0, "groceries": 1.0, "grocery store": 1.0,
+        "snacks": 0.4, "water bottles": 0.4, "walmart": 0.8, "target": 0.3, "target store": 1.0,
+    },
+}
+
+# Routes below this confidence are ignored by callers
+MIN_CONFIDENCE = 0.5
+
+_NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10, "fifteen": 15, "twenty": 20,
+}
+_UNITS = {
+    "mile": METERS_PER_MILE, "miles": METERS_PER_MILE, "mi": METERS_PER_MILE,
+    "kilometer": 1000, "kilometers": 1000, "kilometre": 1000, "kilometres": 1000, "km": 1000, "k": 1000,
+    "meter": 1, "meters": 1, "metre": 1, "metres": 1, "m": 1,
+    "foot": 0.3048, "feet": 0.3048, "ft": 0.3048, "block": 100, "blocks": 100,
+}
+# Abbreviations only count straight after digits ("5 km", "500m"), so that
+# "I am" or "7 am" is not read as "a m"; number words need the full unit
+_ABBREVIATIONS = ("mi", "km", "ft")
+_LETTER_UNITS = ("m", "k")
+_UNIT_WORDS = "|".join(
+    sorted((unit for unit in _UNITS if unit not in _ABBREVIATIONS + _LETTER_UNITS), key=len, reverse=True)
+)
+_RADIUS = re.compile(
+    r"\b(?:(?P<half>half) (?:a |an )?(?P<half_unit>" + _UNIT_WORDS + r")"
+    r"|(?P<word>" + "|".join(_NUMBER_WORDS) + r") (?:and a (?P<word_half>half) )?(?P<word_unit>" + _UNIT_WORDS + r")"
+    r"|(?P<digits>\d+(?:\.\d+)?)(?: ?(?:and a (?P<digits_half>half) )?"
+    r"(?P<digits_unit>" + _UNIT_WORDS + "|" + "|".join(_ABBREVIATIONS) + r")"
+    r"|(?P<letter_unit>" + "|".join(_LETTER_UNITS) + r")))\b"
+    r"(?: and a (?P<half_after>half)\b)?"
+)
+
+_NON_WORD = re.compile(r"[^\w.']+")
+
+
+class Intent(NamedTuple):
+    category: str
+    confidence: float
+    # Search radius the user asked for in meters, if they gave one
+    radius: Optional[int] = None
+
+
+def trie_pattern(words: List[str]) -> str:
+    """
+    Compile words into a regex that shares common prefixes, so matching at a
+    position walks one branch per character instead of trying every word.
+    Longer words win over their prefixes ("rest area" before "rest").
+    """
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        pattern = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            pattern = "(?:" + pattern + ")?"
+        return pattern
+
+    return build(trie)
+
+
+def normalize(text: str) -> str:
+    return " ".join(_NON_WORD.sub(" ", text.lower()).split())
+
+
+def parse_radius(text: str) -> Optional[int]:
+    """
+    Return a distance such as "within 2 miles", "half a mile" or "a mile and a
+    half" in meters, if the text has one.
+    """
+    match = _RADIUS.search(normalize(text))
+    if not match:
+        return None
+    if match.group("half"):
+        value, unit = 0.5, match.group("half_unit")
+    elif match.group("word"):
+        value, unit = float(_NUMBER_WORDS[match.group("word")]), match.group("word_unit")
+    else:
+        value = float(match.group("digits"))
+        unit = match.group("digits_unit") or match.group("letter_unit")
+    if match.group("word_half") or match.group("digits_half") or match.group("half_after"):
+        value += 0.5
+    meters = int(value * _UNITS[unit])
+    return meters if meters > 0 else None
+
+
+class IntentRouter:
+    """
+    Maps an utterance to the place types it asks for.
+
+    All keywords are compiled into a single prefix-trie regex with word
+    boundaries, so "restaurant" no longer also matches "rest" and the cost
+    of routing stays flat as keywords are added. Each category's confidence
+    combines the weights of its matched keywords.
+    """
+
+    def __init__(self, keywords: Dict[str, Dict[str, float]] = INTENT_KEYWORDS) -> None:
+        self._keywords: Dict[str, Tuple[str, float]] = {}
+        for category, words in keywords.items():
+            for word, weight in words.items():
+                self._keywords[normalize(word)] = (category, weight)
+        self._pattern = re.compile(r"\b" + trie_pattern(list(self._keywords)) + r"\b")
+
+    def route_all(self, text: str) -> List[Intent]:
+        """All place types mentioned in ``text``, most confident first."""
+        misses: Dict[str, float] = {}
+        for match in self._pattern.finditer(normalize(text)):
+            category, weight = self._keywords[match.group()]
+            # Each further keyword for a category makes it more likely
+            misses[category] = misses.get(category, 1.0) * (1 - weight)
+        if not misses:
+            return []
+        radius = parse_radius(text)
+        intents = [Intent(category, round(1 - miss, 3), radius) for category, miss in misses.items()]
+        return sorted(intents, key=lambda intent: intent.confidence, reverse=True)
+
+    def route(self, text: str, min_confidence: float = MIN_CONFIDENCE) -> Optional[Intent]:
+        """The most likely place type in ``text``, or None if nothing clears ``min_confidence``."""
+        intents = self.route_all(text)
+        if intents and intents[0].confidence >= min_confidence:
+            return intents[0]
+        return None
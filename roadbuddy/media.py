@@ -0,0 +1,169 @@
+import re
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+# Only content-addressed clips written by the speech cache are served
+_FILE_NAME = re.compile(r"^/([0-9a-f]{16,64}\.mp3)$")
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+CONTENT_TYPES = {".mp3": "audio/mpeg"}
+
+# A year: a clip's name is the hash of its text, so its content never changes
+MAX_AGE = 365 * 24 * 60 * 60
+
+
+class MediaServer:
+    """
+    Serves the files of one directory over HTTP so the page can reference
+    audio by URL instead of inlining it as base64.
+
+    File names are content hashes, so responses carry long-lived immutable
+    ``Cache-Control`` and an ``ETag``, and a clip the browser has already
+    played is not downloaded again. Single-range ``Range`` requests are
+    supported, as browsers use them to load and seek audio. The server runs
+    on daemon threads next to Streamlit.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path],
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        base_url: Optional[str] = None,
+    ) -> None:
+        self.directory = Path(directory)
+        self.host = host
+        self.port = port
+        self.base_url = base_url
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def start(self) -> "MediaServer":
+        """Start serving; falls back to a free port when ``port`` is taken and no ``base_url`` was given."""
+        handler = type("Handler", (_MediaHandler,), {"directory": self.directory})
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        except OSError:
+            if self.base_url:
+                raise
+            self._server = ThreadingHTTPServer((self.host, 0), handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        if not self.base_url:
+            host = "localhost" if self.host in ("127.0.0.1", "0.0.0.0", "") else self.host
+            self.base_url = f"http://{host}:{self.port}"
+        threading.Thread(target=self._server.serve_forever, name="roadbuddy-media", daemon=True).start()
+        return self
+
+    def url_for(self, path: Union[str, Path]) -> str:
+        return f"{self.base_url.rstrip('/')}/{Path(path).name}"
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class _MediaHandler(BaseHTTPRequestHandler):
+    directory: Path
+
+    def do_GET(self) -> None:
+        self._serve(send_body=True)
+
+    def do_HEAD(self) -> None:
+        self._serve(send_body=False)
+
+    def log_message(self, format: str, *args) -> None:
+        # One request per clip would flood the Streamlit console
+        pass
+
+    def _serve(self, send_body: bool) -> None:
+        match = _FILE_NAME.match(self.path.split("?", 1)[0])
+        path = self.directory / match.group(1) if match else None
+        try:
+            f = open(path, "rb") if path is not None else None
+        except OSError:
+            f = None
+        if f is None:
+            self.send_error(404)
+            return
+
+        with f:
+            stat = Path(f.name).stat()
+            size = stat.st_size
+            etag = f'"{path.stem}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self._send_cache_headers(etag, stat.st_mtime)
+                self.end_headers()
+                return
+
+            byte_range = _parse_range(self.headers.get("Range"), size)
+            if byte_range == (-1, -1):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.end_headers()
+                return
+            if byte_range is None:
+                start, end = 0, size - 1
+                self.send_response(200)
+            else:
+                start, end = byte_range
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+
+            self.send_header("Content-Type", CONTENT_TYPES.get(path.suffix, "application/octet-stream"))
+            self.send_header("Content-Length", str(end - start + 1))
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self._send_cache_headers(etag, stat.st_mtime)
+            self.end_headers()
+            if send_body and end >= start:
+                f.seek(start)
+                try:
+                    _copy(f, self.wfile, end - start + 1)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The browser stopped the clip early
+                    pass
+
+    def _send_cache_headers(self, etag: str, mtime: float) -> None:
+        self.send_header("Cache-Control", f"public, max-age={MAX_AGE}, immutable")
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", formatdate(mtime, usegmt=True))
+
+
+def _parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single ``bytes=`` range into inclusive offsets. Returns None to
+    serve the whole file (no header, or one we don't support) and (-1, -1)
+    when the range cannot be satisfied.
+    """
+    if not header:
+        return None
+    match = _RANGE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return -1, -1
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return -1, -1
+    return start, end
+
+
+def _copy(source, target, length: int, chunk_size: int = 64 * 1024) -> None:
+    while length > 0:
+        chunk = source.read(min(chunk_size, length))
+        if not chunk:
+            break
+        target.write(chunk)
+        length -= len(chunk)
@@ -0,0 +1,71 @@
+import time
+from collections import deque
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from geo import METERS_PER_MILE, bearing_many, calculate_distance
+
+# Below this speed (m/s, about 4.5 mph) the car counts as stopped
+MIN_SPEED = 2.0
+
+
+class Motion(NamedTuple):
+    # Compass heading in degrees (0 = north)
+    heading: float
+    # Meters per second
+    speed: float
+
+
+class MotionTracker:
+    """
+    Estimates heading and speed from successive location fixes.
+
+    The browser's own heading and speed are used when it reports them (most
+    phones do while moving). Otherwise they are derived from the oldest fix in
+    the last ``window`` seconds that is at least ``min_distance`` meters away,
+    which smooths out GPS jitter. ``update`` returns None while the car is
+    stopped or there is not enough history yet.
+    """
+
+    def __init__(self, window: float = 60, min_distance: float = 50, max_fixes: int = 20) -> None:
+        self.window = window
+        self.min_distance = min_distance
+        self._fixes: deque = deque(maxlen=max_fixes)
+        self.motion: Optional[Motion] = None
+
+    def update(
+        self,
+        lat: float,
+        lon: float,
+        timestamp: Optional[float] = None,
+        heading: Optional[float] = None,
+        speed: Optional[float] = None,
+    ) -> Optional[Motion]:
+        """Add a fix (``timestamp`` in seconds) and return the current motion estimate."""
+        timestamp = time.time() if timestamp is None else timestamp
+        if self._fixes and timestamp <= self._fixes[-1][0]:
+            # Same fix again (Streamlit reruns without a new reading)
+            return self.motion
+        self._fixes.append((timestamp, lat, lon))
+        while self._fixes and timestamp - self._fixes[0][0] > self.window:
+            self._fixes.popleft()
+
+        if speed is not None and heading is not None and speed >= MIN_SPEED:
+            self.motion = Motion(float(heading) % 360, float(speed))
+            return self.motion
+
+        self.motion = None
+        for then, old_lat, old_lon in self._fixes:
+            if then >= timestamp:
+                break
+            meters = calculate_distance(old_lat, old_lon, lat, lon) * METERS_PER_MILE
+            if meters < self.min_distance:
+                # Later fixes are even closer to the current one
+                break
+            estimated_speed = meters / (timestamp - then)
+            if estimated_speed >= MIN_SPEED:
+                bearing = float(bearing_many(old_lat, old_lon, np.array(lat), np.array(lon)))
+                self.motion = Motion(bearing, estimated_speed)
+            break
+        return self.motion
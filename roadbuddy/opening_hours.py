@@ -0,0 +1,90 @@
+import re
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
+
+DAYS = ["Mo", "Tu", "We", "Th", "Fr", "Sa", "Su"]
+
+_DAY_SELECTOR = re.compile(r"^((?:Mo|Tu|We|Th|Fr|Sa|Su)(?:\s*-\s*(?:Mo|Tu|We|Th|Fr|Sa|Su))?(?:\s*,\s*(?:Mo|Tu|We|Th|Fr|Sa|Su)(?:\s*-\s*(?:Mo|Tu|We|Th|Fr|Sa|Su))?)*)\s+(.+)$")
+_TIME_RANGE = re.compile(r"^(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})$")
+
+Schedule = Dict[int, List[Tuple[int, int]]]
+
+
+@lru_cache(maxsize=4096)
+def parse_opening_hours(spec: str) -> Optional[Schedule]:
+    """
+    Parse the common subset of the OSM ``opening_hours`` syntax into minutes
+    open per weekday (0 = Monday). Later rules override earlier ones for the
+    days they name, as in OSM. Returns None for anything outside the subset
+    (months, holidays, comments, ...), so callers can treat it as unknown.
+    Results are memoized, so callers must not modify them.
+    """
+    spec = spec.strip()
+    if not spec:
+        return None
+    if spec == "24/7":
+        return {day: [(0, 24 * 60)] for day in range(7)}
+
+    schedule: Schedule = {day: [] for day in range(7)}
+    for rule in filter(None, (part.strip() for part in spec.split(";"))):
+        match = _DAY_SELECTOR.match(rule)
+        if match:
+            days = _parse_days(match.group(1))
+            times = match.group(2).strip()
+        else:
+            days = set(range(7))
+            times = rule
+        ranges = _parse_times(times)
+        if ranges is None:
+            return None
+        for day in days:
+            schedule[day] = ranges
+    return schedule
+
+
+def is_open(spec: str, now: Optional[datetime] = None) -> Optional[bool]:
+    """Whether a place with this ``opening_hours`` value is open at ``now``; None if unknown."""
+    schedule = parse_opening_hours(spec)
+    if schedule is None:
+        return None
+    now = now or datetime.now()
+    today = now.weekday()
+    minute = now.hour * 60 + now.minute
+
+    for start, end in schedule[today]:
+        if start < end and start <= minute < end:
+            return True
+        if end <= start and minute >= start:
+            return True
+    # Ranges past midnight that started yesterday
+    for start, end in schedule[(today - 1) % 7]:
+        if end <= start and minute < end:
+            return True
+    return False
+
+
+def _parse_days(selector: str) -> Set[int]:
+    days = set()
+    for part in selector.split(","):
+        bounds = [DAYS.index(day.strip()) for day in part.split("-")]
+        first, last = bounds[0], bounds[-1]
+        day = first
+        days.add(day)
+        while day != last:
+            day = (day + 1) % 7
+            days.add(day)
+    return days
+
+
+def _parse_times(times: str) -> Optional[List[Tuple[int, int]]]:
+    if times in ("off", "closed"):
+        return []
+    ranges = []
+    for part in times.split(","):
+        match = _TIME_RANGE.match(part.strip())
+        if not match:
+            return None
+        start_hour, start_minute, end_hour, end_minute = map(int, match.groups())
+        ranges.append((start_hour * 60 + start_minute, end_hour * 60 + end_minute))
+    return ranges
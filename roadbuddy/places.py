@@ -0,0 +1,519 @@
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from geo import (
+    METERS_PER_MILE,
+    bearing_many,
+    destination_point,
+    equirectangular_many,
+    geohash_cell,
+    haversine_many,
+    track_offsets_many,
+)
+from opening_hours import is_open
+
+OVERPASS_URL = "https://overpass-api.de/api/interpreter"
+
+# Map place types to OSM tags
+OSM_QUERIES = {
+    "coffee": '[amenity=cafe]',
+    "restaurant": '[amenity=restaurant]',
+    "gas": '[amenity=fuel]',
+    "rest_area": '[highway=rest_area]',
+    "parking": '[amenity=parking]',
+    "hospital": '[amenity=hospital]',
+    "pharmacy": '[amenity=pharmacy]',
+    "hotel": '[tourism=hotel]',
+    "atm": '[amenity=atm]',
+    "supermarket": '[shop=supermarket]'
+}
+
+# Place type -> (OSM key, OSM value), derived from the Overpass filters
+OSM_TAGS: Dict[str, Tuple[str, str]] = {
+    place_type: re.match(r"\[(\w+)=(\w+)\]", query).groups() for place_type, query in OSM_QUERIES.items()
+}
+
+# Ranking weights: a place's effective distance is multiplied by these
+CLOSED_PENALTY = 4.0
+# Up to this much extra for places directly behind the direction of travel
+BEHIND_PENALTY = 2.0
+
+# Searches up to this radius (meters) use the equirectangular distance approximation
+APPROXIMATE_RADIUS = 50_000
+
+# Corridor search: how far ahead to look (seconds of driving, clamped to meters),
+# how far either side of the road a place may be, and the step lengths are
+# rounded up to so that nearby searches share cache entries
+CORRIDOR_LOOKAHEAD = 10 * 60
+CORRIDOR_MIN_LENGTH = 3_000
+CORRIDOR_MAX_LENGTH = 25_000
+CORRIDOR_WIDTH = 1_500
+CORRIDOR_STEP = 2_500
+# Places this close behind the car (meters) still count, at the cost of a turnaround
+BEHIND_ALLOWANCE = 150
+# Leaving the road to reach a place and getting back costs about this much per meter off it
+DETOUR_FACTOR = 2.0
+# ETAs are computed with at least this speed (m/s) so slow traffic doesn't blow them up
+MIN_ETA_SPEED = 5.0
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: ``rate`` tokens are added per second up to
+    ``capacity``, and every request takes one.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: float = 0.0) -> bool:
+        """Take a token, waiting up to ``timeout`` seconds. Returns False if none became available."""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+def element_to_place(element: dict) -> Optional[dict]:
+    """Convert an Overpass element into a place dict with coordinates, or None if it has none."""
+    tags = element.get("tags", {})
+    if element.get("type") == "node":
+        place_lat = element.get("lat")
+        place_lon = element.get("lon")
+    else:
+        place_lat = element.get("center", {}).get("lat")
+        place_lon = element.get("center", {}).get("lon")
+    if place_lat is None or place_lon is None:
+        return None
+
+    return {
+        "name": tags.get("name", "Unnamed"),
+        "lat": place_lat,
+        "lon": place_lon,
+        "address": tags.get("addr:street", ""),
+        "cuisine": tags.get("cuisine", ""),
+        "brand": tags.get("brand", ""),
+        "opening_hours": tags.get("opening_hours", "")
+    }
+
+
+def rank_places(
+    places: List[dict],
+    lat: float,
+    lon: float,
+    radius: int,
+    limit: int = 5,
+    heading: Optional[float] = None,
+    now: Optional[datetime] = None,
+    lats: Optional[np.ndarray] = None,
+    lons: Optional[np.ndarray] = None,
+) -> List[dict]:
+    """
+    Return the best ``limit`` places within ``radius`` meters of the point, with
+    their distance in miles and whether they are open at ``now``, the
+    driver's local time (``open_now`` is None for every place when it is not
+    known).
+
+    Distances for all candidates are computed in one vectorized pass (with the
+    equirectangular approximation for short ranges) and only the top ``limit``
+    are fully sorted. Places known to be closed, and places behind the
+    direction of travel when ``heading`` (degrees) is given, rank as if they
+    were further away. ``lats``/``lons`` may pass the candidates'
+    coordinates as arrays when the caller already has them.
+    """
+    if not places:
+        return []
+    if lats is None or lons is None:
+        lats = np.fromiter((place["lat"] for place in places), dtype=float, count=len(places))
+        lons = np.fromiter((place["lon"] for place in places), dtype=float, count=len(places))
+    distance = equirectangular_many if radius <= APPROXIMATE_RADIUS else haversine_many
+    distances = distance(lat, lon, lats, lons)
+
+    within = np.flatnonzero(distances <= radius / METERS_PER_MILE)
+    if within.size == 0:
+        return []
+    k = min(limit, within.size)
+
+    # Penalties can at most multiply a distance by this, so anything further
+    # than the k-th nearest place times it can never make the top k
+    worst = CLOSED_PENALTY * ((1 + BEHIND_PENALTY) if heading is not None else 1)
+    bound = np.partition(distances[within], k - 1)[k - 1] * worst
+    within = within[distances[within] <= bound]
+
+    open_now = [is_open(places[i]["opening_hours"], now) if now is not None else None for i in within]
+    scores = distances[within] * np.array([CLOSED_PENALTY if state is False else 1.0 for state in open_now])
+    if heading is not None:
+        offset = np.radians(bearing_many(lat, lon, lats[within], lons[within]) - heading)
+        scores *= 1 + BEHIND_PENALTY * (1 - np.cos(offset)) / 2
+
+    top = np.argpartition(scores, k - 1)[:k]
+    top = top[np.argsort(scores[top], kind="stable")]
+    return [
+        dict(places[within[i]], distance=float(distances[within[i]]), open_now=open_now[i])
+        for i in top
+    ]
+
+
+def rank_along_route(
+    places: List[dict],
+    lat: float,
+    lon: float,
+    heading: float,
+    speed: float,
+    length: float,
+    width: float = CORRIDOR_WIDTH,
+    limit: int = 5,
+    now: Optional[datetime] = None,
+    lats: Optional[np.ndarray] = None,
+    lons: Optional[np.ndarray] = None,
+) -> List[dict]:
+    """
+    Return the best ``limit`` places in the corridor ``length`` meters ahead
+    of the car along ``heading`` and ``width`` meters either side, ranked by
+    the estimated time to reach them at ``speed`` m/s.
+
+    The estimate is the distance along the road plus the detour off it.
+    Places the car is just passing (``BEHIND_ALLOWANCE``) are kept but cost
+    a turnaround, and places known to be closed at ``now`` (the driver's local
+    time, if known) rank as if further away. Each result carries its
+    straight-line ``distance`` in miles, ``open_now`` and ``minutes_away``.
+    """
+    if not places:
+        return []
+    if lats is None or lons is None:
+        lats = np.fromiter((place["lat"] for place in places), dtype=float, count=len(places))
+        lons = np.fromiter((place["lon"] for place in places), dtype=float, count=len(places))
+    along, cross = track_offsets_many(lat, lon, heading, lats, lons)
+    cross = np.abs(cross)
+
+    within = np.flatnonzero((along >= -BEHIND_ALLOWANCE) & (along <= length) & (cross <= width))
+    if within.size == 0:
+        return []
+    k = min(limit, within.size)
+
+    along, cross = along[within], cross[within]
+    road = np.where(along >= 0, along, -along * (1 + BEHIND_PENALTY))
+    seconds = (road + DETOUR_FACTOR * cross) / max(speed, MIN_ETA_SPEED)
+
+    open_now = [is_open(places[i]["opening_hours"], now) if now is not None else None for i in within]
+    scores = seconds * np.array([CLOSED_PENALTY if state is False else 1.0 for state in open_now])
+
+    top = np.argpartition(scores, k - 1)[:k]
+    top = top[np.argsort(scores[top], kind="stable")]
+    distances = equirectangular_many(lat, lon, lats[within[top]], lons[within[top]])
+    return [
+        dict(
+            places[within[i]],
+            distance=float(distance),
+            open_now=open_now[i],
+            minutes_away=float(seconds[i]) / 60,
+        )
+        for i, distance in zip(top, distances)
+    ]
+
+
+def corridor_length(speed: float) -> float:
+    """How far ahead (meters) to search at ``speed`` m/s, rounded up to ``CORRIDOR_STEP``."""
+    length = min(max(speed * CORRIDOR_LOOKAHEAD, CORRIDOR_MIN_LENGTH), CORRIDOR_MAX_LENGTH)
+    return math.ceil(length / CORRIDOR_STEP) * CORRIDOR_STEP
+
+
+def corridor_area(lat: float, lon: float, heading: float, length: float, width: float) -> Tuple[float, float, int]:
+    """Center and radius (meters) of a circle covering the corridor ahead of the car."""
+    center_lat, center_lon = destination_point(lat, lon, heading, (length - BEHIND_ALLOWANCE) / 2)
+    return center_lat, center_lon, int(math.hypot((length + BEHIND_ALLOWANCE) / 2, width))
+
+
+class PlacesClient:
+    """
+    Overpass client for nearby-places lookups.
+
+    Requests go through one pooled ``requests.Session`` and a token bucket that
+    keeps us within Overpass usage limits. Results are cached per geohash cell,
+    place type and radius: the query is centered on the cell and widened to
+    cover the whole cell, so any later lookup from inside the same cell is
+    answered from memory by re-filtering and re-ranking against the exact
+    coordinates.
+
+    When a ``local_index`` (see ``poi_index.POIIndex``) covers the search area
+    it answers in-process and Overpass is not contacted at all.
+
+    ``search_corridor`` looks ahead of a moving car instead of around it.
+    ``warm`` and ``warm_corridor`` fill the cache ahead of time (see
+    ``prefetch.Prefetcher``) so the answer is already local when the driver
+    asks.
+    """
+
+    def __init__(
+        self,
+        url: str = OVERPASS_URL,
+        ttl: float = 15 * 60,
+        precision: int = 6,
+        max_entries: int = 512,
+        rate: float = 0.5,
+        burst: int = 2,
+        timeout: float = 10,
+        local_index=None,
+    ) -> None:
+        self.url = url
+        self.local_index = local_index
+        self.ttl = ttl
+        self.precision = precision
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.rate_limiter = TokenBucket(rate, burst)
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = "RoadBuddy/1.0"
+        self.session.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=4))
+        self.hits = 0
+        self.misses = 0
+        self._cache: "OrderedDict[Tuple[str, str, int], Tuple[float, List[dict]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def search(
+        self,
+        lat: float,
+        lon: float,
+        place_type: str,
+        radius: int = 5000,
+        limit: int = 5,
+        heading: Optional[float] = None,
+        now: Optional[datetime] = None,
+    ) -> List[dict]:
+        """Return the best ``limit`` places of ``place_type`` within ``radius`` meters (see ``rank_places``)."""
+        if self.local_index is not None and self.local_index.covers(lat, lon, radius):
+            return self.local_index.search(lat, lon, place_type, radius, limit, heading, now)
+        return rank_places(self._candidates(lat, lon, place_type, radius), lat, lon, radius, limit, heading, now)
+
+    def search_many(
+        self,
+        lat: float,
+        lon: float,
+        place_types: List[str],
+        radius: int = 5000,
+        limit: int = 5,
+        heading: Optional[float] = None,
+        now: Optional[datetime] = None,
+    ) -> Dict[str, List[dict]]:
+        """Like ``search`` for several place types at once; whatever is not cached is fetched in one request."""
+        if self.local_index is not None and self.local_index.covers(lat, lon, radius):
+            return {
+                place_type: self.local_index.search(lat, lon, place_type, radius, limit, heading, now)
+                for place_type in place_types
+            }
+        candidates = self._candidates_many(lat, lon, place_types, radius)
+        return {
+            place_type: rank_places(places, lat, lon, radius, limit, heading, now)
+            for place_type, places in candidates.items()
+        }
+
+    def search_corridor(
+        self,
+        lat: float,
+        lon: float,
+        place_type: str,
+        heading: float,
+        speed: float,
+        limit: int = 5,
+        width: float = CORRIDOR_WIDTH,
+        now: Optional[datetime] = None,
+    ) -> List[dict]:
+        """Return the best ``limit`` places ahead of a car moving at ``speed`` m/s (see ``rank_along_route``)."""
+        return self.search_corridor_many(lat, lon, [place_type], heading, speed, limit, width, now)[place_type]
+
+    def search_corridor_many(
+        self,
+        lat: float,
+        lon: float,
+        place_types: List[str],
+        heading: float,
+        speed: float,
+        limit: int = 5,
+        width: float = CORRIDOR_WIDTH,
+        now: Optional[datetime] = None,
+    ) -> Dict[str, List[dict]]:
+        """Like ``search_corridor`` for several place types at once, fetching what is not cached in one request."""
+        length = corridor_length(speed)
+        center_lat, center_lon, radius = corridor_area(lat, lon, heading, length, width)
+        if self.local_index is not None and self.local_index.covers(center_lat, center_lon, radius):
+            results = {}
+            for place_type in place_types:
+                candidates, lats, lons = self.local_index.candidates(center_lat, center_lon, place_type, radius)
+                results[place_type] = rank_along_route(
+                    candidates, lat, lon, heading, speed, length, width, limit, now, lats=lats, lons=lons
+                )
+            return results
+        # Corridors span several kilometers, so cache them on coarser cells
+        candidates = self._candidates_many(center_lat, center_lon, place_types, radius, self.precision - 1)
+        return {
+            place_type: rank_along_route(places, lat, lon, heading, speed, length, width, limit, now)
+            for place_type, places in candidates.items()
+        }
+
+    def warm(self, lat: float, lon: float, place_types: List[str], radius: int, precision: Optional[int] = None) -> None:
+        """
+        Make sure the candidates ``search`` would use for this area are cached
+        for each of ``place_types``. Those missing or past half their ``ttl``
+        are fetched together in one request.
+        """
+        if self.local_index is not None and self.local_index.covers(lat, lon, radius):
+            return
+        cell, center_lat, center_lon, half_diagonal = geohash_cell(lat, lon, precision or self.precision)
+        with self._lock:
+            stale = []
+            for place_type in dict.fromkeys(place_types):
+                entry = self._cache.get((cell, place_type, radius))
+                if entry is None or time.monotonic() - entry[0] > self.ttl / 2:
+                    stale.append(place_type)
+        if not stale:
+            return
+        fetched = self._fetch_many(center_lat, center_lon, stale, int(radius + half_diagonal))
+        if fetched is not None:
+            for place_type, places in fetched.items():
+                self._store((cell, place_type, radius), places)
+
+    def warm_corridor(
+        self,
+        lat: float,
+        lon: float,
+        place_types: List[str],
+        heading: float,
+        speed: float,
+        width: float = CORRIDOR_WIDTH,
+    ) -> None:
+        """
+        Warm the cache for the corridor ahead of the car and for the one it
+        will be searching from halfway along it.
+        """
+        length = corridor_length(speed)
+        for origin_lat, origin_lon in [(lat, lon), destination_point(lat, lon, heading, length / 2)]:
+            center_lat, center_lon, radius = corridor_area(origin_lat, origin_lon, heading, length, width)
+            self.warm(center_lat, center_lon, place_types, radius, self.precision - 1)
+
+    def _candidates(self, lat: float, lon: float, place_type: str, radius: int, precision: Optional[int] = None) -> List[dict]:
+        """Unranked places of ``place_type`` covering ``radius`` meters around the point, cached per geohash cell."""
+        return self._candidates_many(lat, lon, [place_type], radius, precision)[place_type]
+
+    def _candidates_many(
+        self,
+        lat: float,
+        lon: float,
+        place_types: List[str],
+        radius: int,
+        precision: Optional[int] = None,
+    ) -> Dict[str, List[dict]]:
+        cell, center_lat, center_lon, half_diagonal = geohash_cell(lat, lon, precision or self.precision)
+        results = {}
+        missing = []
+        for place_type in dict.fromkeys(place_types):
+            candidates = self._cached((cell, place_type, radius))
+            if candidates is None:
+                missing.append(place_type)
+            else:
+                results[place_type] = candidates
+        if not missing:
+            return results
+
+        fetched = self._fetch_many(center_lat, center_lon, missing, int(radius + half_diagonal))
+        for place_type in missing:
+            key = (cell, place_type, radius)
+            if fetched is None:
+                # Rate limited or failed: fall back to an expired entry if there is one
+                results[place_type] = self._cached(key, allow_stale=True) or []
+            else:
+                results[place_type] = fetched[place_type]
+                self._store(key, fetched[place_type])
+        return results
+
+    def _cached(self, key: Tuple[str, str, int], allow_stale: bool = False) -> Optional[List[dict]]:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                if not allow_stale:
+                    self.misses += 1
+                return None
+            fetched_at, places = entry
+            if not allow_stale and time.monotonic() - fetched_at > self.ttl:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(key)
+            if not allow_stale:
+                self.hits += 1
+            return places
+
+    def _store(self, key: Tuple[str, str, int], places: List[dict]) -> None:
+        with self._lock:
+            self._cache[key] = (time.monotonic(), places)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def _fetch_many(self, lat: float, lon: float, place_types: List[str], radius: int) -> Optional[Dict[str, List[dict]]]:
+        """
+        Fetch several place types in one Overpass request: the union of their
+        filters, with the elements sorted back into per-type lists by tag.
+
+        The output is not limited. Overpass applies a limit in element-ID order,
+        not by distance, so a capped response would hand ranking an arbitrary
+        subset in dense areas and miss the nearest places.
+        """
+        filters = "".join(
+            f"""
+      node{query_tag}(around:{radius},{lat},{lon});
+      way{query_tag}(around:{radius},{lat},{lon});"""
+            for query_tag in (OSM_QUERIES.get(place_type, '[amenity=cafe]') for place_type in place_types)
+        )
+        overpass_query = f"""
+    [out:json][timeout:{int(self.timeout)}];
+    ({filters}
+    );
+    out center body;
+    """
+        if not self.rate_limiter.acquire(timeout=self.timeout):
+            return None
+        try:
+            response = self.session.post(self.url, data={"data": overpass_query}, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+        except (requests.RequestException, ValueError):
+            return None
+
+        tags = {place_type: OSM_TAGS.get(place_type, ("amenity", "cafe")) for place_type in place_types}
+        results: Dict[str, List[dict]] = {place_type: [] for place_type in place_types}
+        for element in data.get("elements", []):
+            element_tags = element.get("tags", {})
+            matches = [place_type for place_type, (key, value) in tags.items() if element_tags.get(key) == value]
+            if not matches:
+                continue
+            place = element_to_place(element)
+            if place is None:
+                continue
+            for place_type in matches:
+                results[place_type].append(place)
+        return results
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._cache)}
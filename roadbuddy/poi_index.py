@@ -0,0 +1,199 @@
+import json
+import math
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from places import OSM_QUERIES, OSM_TAGS, rank_places
+
+# Size of a grid cell in degrees (about 1.1 km of latitude)
+CELL_DEGREES = 0.01
+
+# (OSM key, OSM value) -> place type
+CATEGORY_TAGS: Dict[Tuple[str, str], str] = {tag: place_type for place_type, tag in OSM_TAGS.items()}
+
+
+def categorize(tags: dict) -> Optional[str]:
+    """Return the place type whose OSM tag matches ``tags``, if any."""
+    for (key, value), place_type in CATEGORY_TAGS.items():
+        if tags.get(key) == value:
+            return place_type
+    return None
+
+
+class _CategoryGrid:
+    """Points of one category sorted by grid cell, with each cell's slice of the arrays."""
+
+    def __init__(self, points: List[Tuple[float, float, int]]) -> None:
+        points.sort(key=lambda point: _cell(point[0], point[1]))
+        self.lats = np.array([point[0] for point in points], dtype=float)
+        self.lons = np.array([point[1] for point in points], dtype=float)
+        self.ids = np.array([point[2] for point in points], dtype=np.uint32)
+        self.cells: Dict[Tuple[int, int], Tuple[int, int]] = {}
+        for position, (lat, lon, _) in enumerate(points):
+            cell = _cell(lat, lon)
+            start, _ = self.cells.get(cell, (position, position))
+            self.cells[cell] = (start, position + 1)
+
+
+def _cell(lat: float, lon: float) -> Tuple[int, int]:
+    return int(math.floor(lat / CELL_DEGREES)), int(math.floor(lon / CELL_DEGREES))
+
+
+class POIIndex:
+    """
+    In-process index of points of interest for an offline region.
+
+    Coordinates live in flat NumPy arrays per category, sorted by grid cell,
+    so a radius query only slices the handful of cells that overlap the
+    search circle and ranks them in one vectorized pass. Place details are
+    kept once per point and only materialized for results.
+    """
+
+    def __init__(self, places: Iterable[dict], bounds: Optional[Tuple[float, float, float, float]] = None) -> None:
+        self._places: List[dict] = []
+        points: Dict[str, List[Tuple[float, float, int]]] = {place_type: [] for place_type in OSM_QUERIES}
+        for place in places:
+            place_id = len(self._places)
+            self._places.append(place)
+            points[place["type"]].append((place["lat"], place["lon"], place_id))
+        self._grids = {place_type: _CategoryGrid(items) for place_type, items in points.items()}
+
+        if bounds is None and self._places:
+            lats = [place["lat"] for place in self._places]
+            lons = [place["lon"] for place in self._places]
+            bounds = (min(lats), max(lats), min(lons), max(lons))
+        # (min_lat, max_lat, min_lon, max_lon) of the region the extract covers
+        self.bounds = bounds
+
+    def __len__(self) -> int:
+        return len(self._places)
+
+    def covers(self, lat: float, lon: float, radius: int) -> bool:
+        """Whether the whole search circle lies inside the loaded region."""
+        if self.bounds is None:
+            return False
+        dlat, dlon = _degree_span(lat, radius)
+        min_lat, max_lat, min_lon, max_lon = self.bounds
+        return (
+            min_lat <= lat - dlat and lat + dlat <= max_lat
+            and min_lon <= lon - dlon and lon + dlon <= max_lon
+        )
+
+    def search(
+        self,
+        lat: float,
+        lon: float,
+        place_type: str,
+        radius: int = 5000,
+        limit: int = 5,
+        heading: Optional[float] = None,
+        now: Optional[datetime] = None,
+    ) -> List[dict]:
+        """Return the best ``limit`` places of ``place_type`` within ``radius`` meters (see ``rank_places``)."""
+        places, lats, lons = self.candidates(lat, lon, place_type, radius)
+        return rank_places(places, lat, lon, radius, limit, heading, now, lats=lats, lons=lons)
+
+    def candidates(self, lat: float, lon: float, place_type: str, radius: int) -> Tuple[List[dict], np.ndarray, np.ndarray]:
+        """Unranked places of ``place_type`` in the grid cells overlapping the circle, with their coordinates."""
+        grid = self._grids.get(place_type)
+        if grid is None:
+            return [], np.empty(0), np.empty(0)
+        dlat, dlon = _degree_span(lat, radius)
+        min_i, min_j = _cell(lat - dlat, lon - dlon)
+        max_i, max_j = _cell(lat + dlat, lon + dlon)
+
+        spans = [
+            slice(*grid.cells[(i, j)])
+            for i in range(min_i, max_i + 1)
+            for j in range(min_j, max_j + 1)
+            if (i, j) in grid.cells
+        ]
+        if not spans:
+            return [], np.empty(0), np.empty(0)
+        ids = np.concatenate([grid.ids[span] for span in spans])
+        return (
+            [self._places[place_id] for place_id in ids],
+            np.concatenate([grid.lats[span] for span in spans]),
+            np.concatenate([grid.lons[span] for span in spans]),
+        )
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "POIIndex":
+        """Load an OSM extract: Overpass/OSM JSON, or PBF when pyosmium is installed."""
+        path = Path(path)
+        if path.suffix == ".pbf":
+            return cls(_read_pbf(path))
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        bounds = data.get("bounds")
+        if bounds:
+            bounds = (bounds["minlat"], bounds["maxlat"], bounds["minlon"], bounds["maxlon"])
+        return cls(_read_elements(data.get("elements", [])), bounds)
+
+
+def _degree_span(lat: float, radius: int) -> Tuple[float, float]:
+    """Latitude and longitude half-extent in degrees of a circle of ``radius`` meters."""
+    dlat = radius / 111_320
+    dlon = radius / (111_320 * max(math.cos(math.radians(lat)), 0.01))
+    return dlat, dlon
+
+
+def _place(place_type: str, lat: float, lon: float, tags: dict) -> dict:
+    return {
+        "type": place_type,
+        "name": tags.get("name", "Unnamed"),
+        "lat": lat,
+        "lon": lon,
+        "address": tags.get("addr:street", ""),
+        "cuisine": tags.get("cuisine", ""),
+        "brand": tags.get("brand", ""),
+        "opening_hours": tags.get("opening_hours", "")
+    }
+
+
+def _read_elements(elements: Iterable[dict]) -> Iterable[dict]:
+    for element in elements:
+        tags = element.get("tags", {})
+        place_type = categorize(tags)
+        if place_type is None:
+            continue
+        if "lat" in element and "lon" in element:
+            lat, lon = element["lat"], element["lon"]
+        elif "center" in element:
+            lat, lon = element["center"]["lat"], element["center"]["lon"]
+        else:
+            continue
+        yield _place(place_type, lat, lon, tags)
+
+
+def _read_pbf(path: Path) -> List[dict]:
+    try:
+        import osmium
+    except ImportError as e:
+        raise ImportError("Loading .pbf extracts requires pyosmium: pip install osmium") from e
+
+    places = []
+
+    class Handler(osmium.SimpleHandler):
+        def node(self, node):
+            tags = {tag.k: tag.v for tag in node.tags}
+            place_type = categorize(tags)
+            if place_type and node.location.valid():
+                places.append(_place(place_type, node.location.lat, node.location.lon, tags))
+
+        def way(self, way):
+            tags = {tag.k: tag.v for tag in way.tags}
+            place_type = categorize(tags)
+            if not place_type:
+                return
+            locations = [node.location for node in way.nodes if node.location.valid()]
+            if locations:
+                lat = sum(location.lat for location in locations) / len(locations)
+                lon = sum(location.lon for location in locations) / len(locations)
+                places.append(_place(place_type, lat, lon, tags))
+
+    Handler().apply_file(str(path), locations=True)
+    return places
@@ -0,0 +1,98 @@
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from geo import calculate_distance
+from motion import Motion
+from places import PlacesClient
+
+
+class _Request(NamedTuple):
+    lat: float
+    lon: float
+    radius: int
+    motion: Optional[Motion]
+
+
+class Prefetcher:
+    """
+    Keeps the places cache warm around every driver from a background thread,
+    outside Streamlit's rerun cycle.
+
+    Each session reports its position with ``update``. Once a driver has moved
+    ``refresh_miles`` since the last refresh, or that refresh is
+    ``refresh_seconds`` old, the worker fetches ``place_types`` for the area
+    around them (and the corridor ahead while they are moving). Only the
+    latest position per session is kept, so a backlog never builds up, and a
+    refresh that is overtaken by a newer position stops early.
+    """
+
+    def __init__(
+        self,
+        client: PlacesClient,
+        place_types: List[str],
+        refresh_miles: float = 0.5,
+        refresh_seconds: Optional[float] = None,
+        session_ttl: float = 30 * 60,
+    ) -> None:
+        self.client = client
+        self.place_types = list(place_types)
+        self.refresh_miles = refresh_miles
+        # Refresh before cached entries expire
+        self.refresh_seconds = refresh_seconds if refresh_seconds is not None else client.ttl / 2
+        self.session_ttl = session_ttl
+        self.refreshes = 0
+        self._pending: Dict[str, _Request] = {}
+        # Session -> (lat, lon, monotonic time) of its last scheduled refresh
+        self._last: Dict[str, tuple] = {}
+        self._wakeup = threading.Condition()
+        threading.Thread(target=self._run, name="places-prefetch", daemon=True).start()
+
+    def update(self, session: str, lat: float, lon: float, radius: int, motion: Optional[Motion] = None) -> bool:
+        """Report a session's position. Returns whether a refresh was scheduled."""
+        now = time.monotonic()
+        with self._wakeup:
+            last = self._last.get(session)
+            if (
+                last is not None
+                and now - last[2] < self.refresh_seconds
+                and calculate_distance(lat, lon, last[0], last[1]) < self.refresh_miles
+            ):
+                return False
+            self._last[session] = (lat, lon, now)
+            self._pending[session] = _Request(lat, lon, radius, motion)
+            self._forget_idle_sessions(now)
+            self._wakeup.notify()
+        return True
+
+    def _run(self) -> None:
+        while True:
+            with self._wakeup:
+                while not self._pending:
+                    self._wakeup.wait()
+                session = next(iter(self._pending))
+                request = self._pending.pop(session)
+            try:
+                self._refresh(session, request)
+            except Exception:
+                # Never let one bad refresh stop the worker; lookups fall back to fetching
+                pass
+
+    def _refresh(self, session: str, request: _Request) -> None:
+        # Each call fetches all place types in a single Overpass request
+        self.client.warm(request.lat, request.lon, self.place_types, request.radius)
+        if request.motion is not None and not self._superseded(session):
+            self.client.warm_corridor(
+                request.lat, request.lon, self.place_types, request.motion.heading, request.motion.speed
+            )
+        with self._wakeup:
+            self.refreshes += 1
+
+    def _superseded(self, session: str) -> bool:
+        with self._wakeup:
+            return session in self._pending
+
+    def _forget_idle_sessions(self, now: float) -> None:
+        for session, (_, _, then) in list(self._last.items()):
+            if now - then > self.session_ttl:
+                del self._last[session]
@@ -1,13 +1,36 @@
 import streamlit as st
 from anthropic import Anthropic
-from gtts import gTTS
+import os
 import tempfile
 import base64
 from streamlit_js_eval import get_geolocation
-import requests
 from audio_recorder_streamlit import audio_recorder
-import speech_recognition as sr
-import io
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from voice import SpeechCache, SpeechStream, audio_duration
+from places import PlacesClient
+from poi_index import POIIndex
+from geocode import ReverseGeocoder
+from context import build_context, with_cache_breakpoints
+from media import MediaServer
+from intents import MIN_CONFIDENCE, IntentRouter
+from motion import MotionTracker
+from prefetch import Prefetcher
+from stt import GoogleBackend, STTBackend, Transcript, VoskBackend, WhisperBackend, transcribe
+
+# Place types kept warm in the places cache while driving (the Rest button looks for parking)
+PREFETCH_PLACE_TYPES = ["coffee", "restaurant", "gas", "rest_area", "parking"]
+
+# Seconds between location fixes (each one updates the motion estimate and the prefetcher)
+LOCATION_REFRESH_SECONDS = 15
+
+# Speech recognition engines selectable in the sidebar
+STT_ENGINES = {"google": "Google (online)", "vosk": "Vosk (offline)", "whisper": "Whisper (offline)"}
+
+GOOGLE_LANGUAGES = {"en": "en-US", "es": "es-ES", "fr": "fr-FR", "de": "de-DE"}
 
 # System prompt for RoadBuddy
 ROADBUDDY_SYSTEM = """You are RoadBuddy — a friendly, calm, human-like passenger riding in a car with the user.
@@ -45,20 +68,112 @@ SAFETY:
 Always behave like a calm, helpful human passenger."""
 
 
+@st.cache_resource
+def get_speech_cache() -> SpeechCache:
+    """Synthesized speech shared by all sessions, cached per sentence."""
+    return SpeechCache(
+        os.environ.get("ROADBUDDY_AUDIO_DIR", os.path.join(tempfile.gettempdir(), "roadbuddy-audio")),
+        max_bytes=int(os.environ.get("ROADBUDDY_AUDIO_MAX_MB", "50")) * 1024 * 1024,
+    )
+
+
+@st.cache_resource
+def get_media_server():
+    """Local HTTP endpoint serving the speech cache, so replies reference audio by URL.
+
+    Set ROADBUDDY_MEDIA_HOST/ROADBUDDY_MEDIA_PORT to change where it listens and
+    ROADBUDDY_MEDIA_URL to the address browsers should use when the app is not
+    opened on the machine it runs on. Returns None (audio is inlined instead)
+    if the server cannot start. See ``use_media_urls`` for when it is used.
+    """
+    try:
+        return MediaServer(
+            get_speech_cache().directory,
+            host=os.environ.get("ROADBUDDY_MEDIA_HOST", "127.0.0.1"),
+            port=int(os.environ.get("ROADBUDDY_MEDIA_PORT", "8765")),
+            base_url=os.environ.get("ROADBUDDY_MEDIA_URL"),
+        ).start()
+    except OSError:
+        return None
+
+
+@st.cache_resource
+def get_places_client() -> PlacesClient:
+    """Overpass client shared by all sessions, with a per-area result cache.
+
+    Set ROADBUDDY_POI_FILE to an OSM extract (.json or .pbf) to answer lookups
+    inside that region offline.
+    """
+    poi_file = os.environ.get("ROADBUDDY_POI_FILE")
+    local_index = POIIndex.load(poi_file) if poi_file else None
+    return PlacesClient(local_index=local_index)
+
+
+@st.cache_resource
+def get_prefetcher() -> Prefetcher:
+    """Background worker that keeps common place types cached around every driver."""
+    return Prefetcher(get_places_client(), PREFETCH_PLACE_TYPES)
+
+
+@st.cache_resource
+def get_stt_backend(engine: str, lang: str = "en") -> STTBackend:
+    """Speech recognizer for ``engine``, loaded once and kept warm for every session.
+
+    The offline engines need ROADBUDDY_VOSK_MODEL (path to an unpacked Vosk
+    model) or faster-whisper, with ROADBUDDY_WHISPER_MODEL choosing the model.
+    """
+    if engine == "vosk":
+        return VoskBackend(os.environ.get("ROADBUDDY_VOSK_MODEL", "model"))
+    if engine == "whisper":
+        default_model = "base.en" if lang == "en" else "base"
+        return WhisperBackend(os.environ.get("ROADBUDDY_WHISPER_MODEL", default_model), language=lang)
+    return GoogleBackend(language=GOOGLE_LANGUAGES.get(lang, "en-US"))
+
+
+@st.cache_resource
+def get_intent_router() -> IntentRouter:
+    """Keyword router shared by voice and typed input, compiled once."""
+    return IntentRouter()
+
+
+@st.cache_resource
+def get_geocoder() -> ReverseGeocoder:
+    """Reverse geocoder shared by all sessions, cached and rate-limited for Nominatim."""
+    return ReverseGeocoder()
+
+
 def init_session_state():
     """Initialize session state variables."""
     if "messages" not in st.session_state:
         st.session_state.messages = []
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
     if "client" not in st.session_state:
         st.session_state.client = None
     if "location" not in st.session_state:
         st.session_state.location = None
     if "location_name" not in st.session_state:
         st.session_state.location_name = None
+    if "location_fix" not in st.session_state:
+        st.session_state.location_fix = None
+    if "motion_tracker" not in st.session_state:
+        st.session_state.motion_tracker = MotionTracker()
+    if "motion" not in st.session_state:
+        st.session_state.motion = None
     if "last_audio_id" not in st.session_state:
         st.session_state.last_audio_id = None
     if "nearby_places" not in st.session_state:
         st.session_state.nearby_places = {}
+    if "context_summary" not in st.session_state:
+        st.session_state.context_summary = ""
+    if "summarized_messages" not in st.session_state:
+        st.session_state.summarized_messages = 0
+    if "usage_totals" not in st.session_state:
+        st.session_state.usage_totals = {}
+    if "last_usage" not in st.session_state:
+        st.session_state.last_usage = None
+    if "stt_unavailable" not in st.session_state:
+        st.session_state.stt_unavailable = {}
 
 
 def set_client(api_key: str):
@@ -66,112 +181,69 @@ def set_client(api_key: str):
     st.session_state.client = Anthropic(api_key=api_key)
 
 
-def get_location_name(lat: float, lon: float) -> str:
-    """Reverse geocode coordinates to get location name."""
-    try:
-        url = f"https://nominatim.openstreetmap.org/reverse?lat={lat}&lon={lon}&format=json"
-        headers = {"User-Agent": "RoadBuddy/1.0"}
-        response = requests.get(url, headers=headers, timeout=5)
-        data = response.json()
-        
-        address = data.get("address", {})
-        city = address.get("city") or address.get("town") or address.get("village") or address.get("county", "")
-        state = address.get("state", "")
-        country = address.get("country", "")
-        
-        if city and state:
-            return f"{city}, {state}"
-        elif city and country:
-            return f"{city}, {country}"
-        elif state:
-            return state
-        else:
-            return data.get("display_name", "Unknown location")[:50]
-    except:
-        return None
+def driver_local_time() -> Optional[datetime]:
+    """
+    The driver's wall-clock time from the browser's timezone, for opening
+    hours. None when the browser did not report it; the server clock may be
+    in another timezone, so places are then not marked open or closed.
+    """
+    now = datetime.now(timezone.utc)
+    if st.context.timezone:
+        try:
+            return now.astimezone(ZoneInfo(st.context.timezone)).replace(tzinfo=None)
+        except (ZoneInfoNotFoundError, ValueError):
+            pass
+    if st.context.timezone_offset is not None:
+        # Minutes the browser's clock is behind UTC, as in JavaScript's getTimezoneOffset()
+        return (now - timedelta(minutes=st.context.timezone_offset)).replace(tzinfo=None)
+    return None
 
 
 def search_nearby_places(lat: float, lon: float, place_type: str, radius: int = 5000) -> list:
-    """Search for nearby places using Overpass API (OpenStreetMap)."""
-    
-    # Map place types to OSM tags
-    osm_queries = {
-        "coffee": '[amenity=cafe]',
-        "restaurant": '[amenity=restaurant]',
-        "gas": '[amenity=fuel]',
-        "rest_area": '[highway=rest_area]',
-        "parking": '[amenity=parking]',
-        "hospital": '[amenity=hospital]',
-        "pharmacy": '[amenity=pharmacy]',
-        "hotel": '[tourism=hotel]',
-        "atm": '[amenity=atm]',
-        "supermarket": '[shop=supermarket]'
-    }
-    
-    query_tag = osm_queries.get(place_type, '[amenity=cafe]')
-    
-    # Overpass API query
-    overpass_url = "https://overpass-api.de/api/interpreter"
-    overpass_query = f"""
-    [out:json][timeout:10];
-    (
-      node{query_tag}(around:{radius},{lat},{lon});
-      way{query_tag}(around:{radius},{lat},{lon});
-    );
-    out center body 5;
-    """
-    
-    try:
-        response = requests.post(overpass_url, data={"data": overpass_query}, timeout=10)
-        data = response.json()
-        
-        places = []
-        for element in data.get("elements", [])[:5]:  # Limit to 5 results
-            tags = element.get("tags", {})
-            name = tags.get("name", "Unnamed")
-            
-            # Get coordinates
-            if element["type"] == "node":
-                place_lat = element["lat"]
-                place_lon = element["lon"]
-            else:
-                place_lat = element.get("center", {}).get("lat", lat)
-                place_lon = element.get("center", {}).get("lon", lon)
-            
-            # Calculate approximate distance
-            distance = calculate_distance(lat, lon, place_lat, place_lon)
-            
-            places.append({
-                "name": name,
-                "distance": distance,
-                "address": tags.get("addr:street", ""),
-                "cuisine": tags.get("cuisine", ""),
-                "brand": tags.get("brand", ""),
-                "opening_hours": tags.get("opening_hours", "")
-            })
-        
-        # Sort by distance
-        places.sort(key=lambda x: x["distance"])
-        return places
-        
-    except Exception as e:
-        return []
-
+    """Search for nearby places using Overpass API (OpenStreetMap), cached per area.
 
-def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """Calculate distance between two points in miles."""
-    from math import radians, sin, cos, sqrt, atan2
-    
-    R = 3959  # Earth's radius in miles
-    
-    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    
-    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-    c = 2 * atan2(sqrt(a), sqrt(1-a))
-    
-    return R * c
+    While the car is moving, places in the corridor ahead are returned
+    instead, ranked by how soon the car can reach them.
+    """
+    motion = st.session_state.motion
+    now = driver_local_time()
+    if motion is not None:
+        places = get_places_client().search_corridor(lat, lon, place_type, motion.heading, motion.speed, now=now)
+        if places:
+            return places
+    return get_places_client().search(lat, lon, place_type, radius, now=now)
+
+
+def search_nearby_places_many(lat: float, lon: float, place_types: list, radius: int = 5000) -> dict:
+    """Search several place types at once (see ``search_nearby_places``), in a single Overpass request."""
+    client = get_places_client()
+    results = {}
+    motion = st.session_state.motion
+    now = driver_local_time()
+    if motion is not None:
+        results = client.search_corridor_many(lat, lon, place_types, motion.heading, motion.speed, now=now)
+    radial = [place_type for place_type in place_types if not results.get(place_type)]
+    if radial:
+        results.update(client.search_many(lat, lon, radial, radius, now=now))
+    return results
+
+
+def find_places_for(text: str, radius: int) -> str:
+    """
+    If ``text`` asks for kinds of places, look them up near the user and
+    return the places context for Claude; otherwise return an empty string. A
+    distance in the request ("within 2 miles") overrides ``radius`` (meters).
+    """
+    if not st.session_state.location:
+        return ""
+    # "I need gas and coffee" asks for both; they are looked up together
+    intents = [intent for intent in get_intent_router().route_all(text) if intent.confidence >= MIN_CONFIDENCE][:3]
+    if not intents:
+        return ""
+    lat, lon = st.session_state.location["lat"], st.session_state.location["lon"]
+    place_types = [intent.category for intent in intents]
+    results = search_nearby_places_many(lat, lon, place_types, intents[0].radius or radius)
+    return "\n".join(format_places_for_voice(results[place_type], place_type) for place_type in place_types)
 
 
 def format_places_for_voice(places: list, place_type: str) -> str:
@@ -202,6 +274,8 @@ def format_places_for_voice(places: list, place_type: str) -> str:
             dist_str = f"about {int(dist * 5280)} feet"
         else:
             dist_str = f"about {dist:.1f} miles"
+        if place.get('minutes_away') is not None:
+            dist_str += f" ahead, about {max(1, round(place['minutes_away']))} min away"
         
         name = place['name']
         if place['brand'] and place['brand'] != name:
@@ -210,38 +284,57 @@ def format_places_for_voice(places: list, place_type: str) -> str:
         extra = ""
         if place['cuisine']:
             extra = f" ({place['cuisine']})"
+        if place.get('open_now') is False:
+            extra += " (closed now)"
         
         result += f"• {name}{extra} - {dist_str}\n"
     
     return result
 
 
-def text_to_speech(text: str, lang: str = "en") -> str:
-    """Convert text to speech and return the audio file path."""
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as fp:
-        tts = gTTS(text=text, lang=lang, slow=False)
-        tts.save(fp.name)
-        return fp.name
+def speech_to_text(audio_bytes: bytes, engine: str = "google", lang: str = "en") -> Transcript:
+    """Convert speech to text with the chosen engine, falling back to Google Speech Recognition.
 
+    An engine that fails to load (e.g. Vosk or Whisper is not installed) is
+    remembered for the session, so it is not retried and warned about on
+    every recording.
+    """
+    backends = []
+    for name in dict.fromkeys([engine, "google"]):
+        if name in st.session_state.stt_unavailable:
+            continue
+        try:
+            backends.append(get_stt_backend(name, lang))
+        except Exception as e:
+            st.session_state.stt_unavailable[name] = str(e)
+            st.warning(f"{STT_ENGINES[name]} unavailable ({e}), using Google.")
+    return transcribe(audio_bytes, backends)
+
+
+def record_usage(usage) -> None:
+    """Keep per-call and running token counts, including prompt-cache reads and writes."""
+    entry = {
+        "input_tokens": usage.input_tokens,
+        "output_tokens": usage.output_tokens,
+        "cache_creation_input_tokens": getattr(usage, "cache_creation_input_tokens", None) or 0,
+        "cache_read_input_tokens": getattr(usage, "cache_read_input_tokens", None) or 0,
+    }
+    st.session_state.last_usage = entry
+    for key, value in entry.items():
+        st.session_state.usage_totals[key] = st.session_state.usage_totals.get(key, 0) + value
 
-def speech_to_text(audio_bytes: bytes) -> str:
-    """Convert speech to text using Google Speech Recognition."""
-    recognizer = sr.Recognizer()
-    
-    try:
-        audio_file = io.BytesIO(audio_bytes)
-        with sr.AudioFile(audio_file) as source:
-            audio_data = recognizer.record(source)
-            text = recognizer.recognize_google(audio_data)
-            return text
-    except:
-        return None
 
+def get_roadbuddy_response(user_message: str, places_context: str = "", on_text=None) -> str:
+    """Get a response from RoadBuddy (Claude).
 
-def get_roadbuddy_response(user_message: str, places_context: str = "") -> str:
-    """Get a response from RoadBuddy (Claude)."""
+    When ``on_text`` is given the reply is streamed and ``on_text`` is called
+    with each piece of text as it arrives.
+    """
     if not st.session_state.client:
-        return "Hey, I need you to add your API key in the settings first. Tap the menu icon in the top left!"
+        message = "Hey, I need you to add your API key in the settings first. Tap the menu icon in the top left!"
+        if on_text:
+            on_text(message)
+        return message
     
     # Build context
     context = ""
@@ -256,13 +349,29 @@ def get_roadbuddy_response(user_message: str, places_context: str = "") -> str:
         "content": user_message + context
     })
     
+    # Send a bounded window of recent turns plus a summary of older ones
+    messages, st.session_state.summarized_messages, st.session_state.context_summary = build_context(
+        st.session_state.messages,
+        st.session_state.summarized_messages,
+        st.session_state.context_summary,
+    )
+    system, messages = with_cache_breakpoints(ROADBUDDY_SYSTEM, messages, st.session_state.context_summary)
+    
     # Get response from Claude
-    response = st.session_state.client.messages.create(
+    request = dict(
         model="claude-sonnet-4-20250514",
         max_tokens=300,
-        system=ROADBUDDY_SYSTEM,
-        messages=st.session_state.messages
+        system=system,
+        messages=messages
     )
+    if on_text is None:
+        response = st.session_state.client.messages.create(**request)
+    else:
+        with st.session_state.client.messages.stream(**request) as stream:
+            for text in stream.text_stream:
+                on_text(text)
+            response = stream.get_final_message()
+    record_usage(response.usage)
     
     assistant_message = response.content[0].text
     
@@ -274,18 +383,139 @@ def get_roadbuddy_response(user_message: str, places_context: str = "") -> str:
     return assistant_message
 
 
-def autoplay_audio(file_path: str):
-    """Create an autoplay audio element."""
-    with open(file_path, "rb") as f:
-        audio_bytes = f.read()
+@st.fragment(run_every=LOCATION_REFRESH_SECONDS)
+def track_location(radius: int):
+    """
+    Take a fresh location fix every ``LOCATION_REFRESH_SECONDS`` and show the
+    location badge. Runs as a fragment on a timer, so the fix, the motion
+    estimate, the location name and the prefetcher stay current while the
+    driver is not touching the app.
+    """
+    # getCurrentPosition only runs when the component is first mounted, so a
+    # new key per period is what makes the browser take a new reading
+    period = int(time.time() // LOCATION_REFRESH_SECONDS)
+    location = get_geolocation(component_key=f"geolocation_{period}")
+    if location and "coords" in location:
+        lat = location["coords"]["latitude"]
+        lon = location["coords"]["longitude"]
+        st.session_state.location = {"lat": lat, "lon": lon}
+
+        # Heading and speed from the browser when it has them, else from successive fixes
+        timestamp = location.get("timestamp")
+        st.session_state.motion = st.session_state.motion_tracker.update(
+            lat,
+            lon,
+            timestamp / 1000 if timestamp else None,
+            location["coords"].get("heading"),
+            location["coords"].get("speed"),
+        )
+        # Only re-resolves the name after the car has moved or the name went stale
+        st.session_state.location_fix = get_geocoder().locate(lat, lon, st.session_state.location_fix)
+        if st.session_state.location_fix["name"]:
+            st.session_state.location_name = st.session_state.location_fix["name"]
+
+    # Warm the places cache in the background as the car moves, so lookups answer from memory
+    if st.session_state.location:
+        get_prefetcher().update(
+            st.session_state.session_id,
+            st.session_state.location["lat"],
+            st.session_state.location["lon"],
+            radius,
+            st.session_state.motion,
+        )
+
+    if st.session_state.location_name:
+        st.markdown(f'<div class="location-badge"><span class="dot"></span>📍 {st.session_state.location_name}</div>', unsafe_allow_html=True)
+
+
+def use_media_urls() -> bool:
+    """
+    Whether the browser can fetch audio from the media server: either
+    ROADBUDDY_MEDIA_URL says where it is reachable, or the app is open on this
+    machine so the default localhost URL works. A remote or HTTPS page could
+    not load http://localhost (or would block it as mixed content).
+    """
+    if os.environ.get("ROADBUDDY_MEDIA_URL"):
+        return True
+    host = st.context.headers.get("Host", "")
+    return host.rsplit(":", 1)[0].strip("[]") in ("localhost", "127.0.0.1", "::1")
+
+
+def autoplay_audio(file_path: str, slot=None):
+    """Create an autoplay audio element (in ``slot`` when given, replacing what it showed).
+
+    When the browser can reach the media server (see ``use_media_urls``) the
+    audio is referenced by URL so only a few bytes go over the websocket;
+    otherwise it is inlined as base64.
+    """
+    media_server = get_media_server() if use_media_urls() else None
+    if media_server is not None:
+        src = media_server.url_for(file_path)
+    else:
+        with open(file_path, "rb") as f:
+            audio_bytes = f.read()
+        src = f"data:audio/mp3;base64,{base64.b64encode(audio_bytes).decode()}"
     
-    b64 = base64.b64encode(audio_bytes).decode()
     audio_html = f"""
         <audio autoplay>
-            <source src="data:audio/mp3;base64,{b64}" type="audio/mp3">
+            <source src="{src}" type="audio/mp3">
         </audio>
     """
-    st.markdown(audio_html, unsafe_allow_html=True)
+    (slot or st).markdown(audio_html, unsafe_allow_html=True)
+
+
+def play_ready_clips(speech: SpeechStream, slot, player: dict, wait: bool = False):
+    """
+    Play the reply's sentence clips in order through ``slot``, each once the
+    previous one has finished. ``player`` keeps when the current clip ends
+    between calls. Without ``wait`` this only starts a clip that is already
+    synthesized and returns immediately; with ``wait`` it plays the rest of a
+    finished reply through to the end.
+    """
+    while True:
+        remaining = player.get("ends_at", 0) - time.monotonic()
+        if remaining > 0:
+            if not wait:
+                return
+            time.sleep(remaining)
+        path = speech.next_clip(timeout=None if wait else 0)
+        if path is None:
+            return
+        autoplay_audio(str(path), slot)
+        # A little slack so a clip isn't cut off by the next one replacing it
+        player["ends_at"] = time.monotonic() + audio_duration(path.stat().st_size) + 0.2
+
+
+def stream_reply(user_message: str, places_context: str = "", speak: bool = True, lang: str = "en") -> str:
+    """
+    Stream RoadBuddy's reply into a chat bubble and speak it as it is written.
+
+    Each sentence is synthesized as soon as Claude finishes it and starts
+    playing while the rest of the reply is still being generated and
+    synthesized, instead of waiting for the whole reply and its full audio.
+    """
+    bubble = st.empty()
+    slot = st.empty()
+    speech = SpeechStream(get_speech_cache(), lang) if speak else None
+    player = {}
+    parts = []
+
+    def on_text(text: str):
+        parts.append(text)
+        bubble.markdown(f'<div class="chat-bubble assistant-bubble">🚗 {"".join(parts)}</div>', unsafe_allow_html=True)
+        if speech:
+            speech.feed(text)
+            play_ready_clips(speech, slot, player)
+
+    try:
+        response = get_roadbuddy_response(user_message, places_context, on_text=on_text)
+        if speech:
+            speech.finish()
+            play_ready_clips(speech, slot, player, wait=True)
+    finally:
+        if speech:
+            speech.close()
+    return response
 
 
 # Page config
@@ -460,18 +690,6 @@ st.markdown("""
 # Initialize
 init_session_state()
 
-# Get location
-location = get_geolocation()
-if location and "coords" in location:
-    lat = location["coords"]["latitude"]
-    lon = location["coords"]["longitude"]
-    st.session_state.location = {"lat": lat, "lon": lon}
-    
-    if not st.session_state.location_name:
-        location_name = get_location_name(lat, lon)
-        if location_name:
-            st.session_state.location_name = location_name
-
 # Sidebar
 with st.sidebar:
     st.markdown("## ⚙️ Settings")
@@ -491,21 +709,31 @@ with st.sidebar:
     
     auto_speak = st.toggle("🔊 Auto-speak", value=True)
     
+    stt_engine = st.selectbox("🎧 Speech recognition", list(STT_ENGINES), format_func=STT_ENGINES.get)
+    
     search_radius = st.slider("📍 Search radius (miles)", 1, 10, 3)
     
+    if st.session_state.last_usage:
+        totals = st.session_state.usage_totals
+        st.caption(
+            f"Prompt cache: {totals['cache_read_input_tokens']:,} tokens read · "
+            f"{totals['cache_creation_input_tokens']:,} written"
+        )
+    
     st.markdown("---")
     
     if st.button("🗑️ Clear chat", use_container_width=True):
         st.session_state.messages = []
         st.session_state.last_audio_id = None
+        st.session_state.context_summary = ""
+        st.session_state.summarized_messages = 0
         st.rerun()
 
 # Header
 st.markdown('<div class="header">', unsafe_allow_html=True)
 st.markdown('<h1>🚗 RoadBuddy</h1>', unsafe_allow_html=True)
 
-if st.session_state.location_name:
-    st.markdown(f'<div class="location-badge"><span class="dot"></span>📍 {st.session_state.location_name}</div>', unsafe_allow_html=True)
+track_location(search_radius * 1609)
 
 st.markdown('</div>', unsafe_allow_html=True)
 
@@ -535,42 +763,22 @@ if audio_bytes:
         st.session_state.last_audio_id = audio_id
         
         with st.spinner("🎧 Listening..."):
-            user_text = speech_to_text(audio_bytes)
+            transcript = speech_to_text(audio_bytes, stt_engine, voice_lang)
+        user_text = transcript.text
         
         if user_text:
             st.success(f"🗣️ \"{user_text}\"")
+            st.caption(
+                f"Recognized by {transcript.backend} in {transcript.latency:.2f}s "
+                f"({transcript.speech_seconds:.1f}s of speech from a {transcript.recorded_seconds:.1f}s clip)"
+            )
             
             # Check if asking for places
-            places_context = ""
-            user_lower = user_text.lower()
+            places_context = find_places_for(user_text, search_radius * 1609)  # Convert miles to meters
             
-            if st.session_state.location:
-                lat = st.session_state.location["lat"]
-                lon = st.session_state.location["lon"]
-                radius_meters = search_radius * 1609  # Convert miles to meters
-                
-                if any(word in user_lower for word in ["coffee", "cafe", "starbucks", "caffeine"]):
-                    places = search_nearby_places(lat, lon, "coffee", radius_meters)
-                    places_context = format_places_for_voice(places, "coffee")
-                elif any(word in user_lower for word in ["food", "restaurant", "eat", "hungry", "lunch", "dinner", "breakfast"]):
-                    places = search_nearby_places(lat, lon, "restaurant", radius_meters)
-                    places_context = format_places_for_voice(places, "restaurant")
-                elif any(word in user_lower for word in ["gas", "fuel", "petrol", "fill up"]):
-                    places = search_nearby_places(lat, lon, "gas", radius_meters)
-                    places_context = format_places_for_voice(places, "gas")
-                elif any(word in user_lower for word in ["rest", "stop", "break", "parking"]):
-                    places = search_nearby_places(lat, lon, "rest_area", radius_meters)
-                    places_context = format_places_for_voice(places, "rest_area")
-            
-            with st.spinner("💭 Thinking..."):
-                response = get_roadbuddy_response(user_text, places_context)
-            
-            st.markdown(f'<div class="chat-bubble assistant-bubble">🚗 {response}</div>', unsafe_allow_html=True)
-            
-            if auto_speak:
-                autoplay_audio(text_to_speech(response, voice_lang))
+            stream_reply(user_text, places_context, auto_speak, voice_lang)
         else:
-            st.warning("Couldn't catch that. Try again!")
+            st.warning(f"Couldn't catch that ({transcript.error}). Try again!")
 
 # Find Nearby Places Section
 st.markdown('<div class="places-section">', unsafe_allow_html=True)
@@ -585,10 +793,7 @@ with col1:
             with st.spinner("Searching..."):
                 places = search_nearby_places(lat, lon, "coffee", search_radius * 1609)
                 places_text = format_places_for_voice(places, "coffee")
-                response = get_roadbuddy_response("Find me nearby coffee shops", places_text)
-            st.markdown(f'<div class="chat-bubble assistant-bubble">🚗 {response}</div>', unsafe_allow_html=True)
-            if auto_speak:
-                autoplay_audio(text_to_speech(response, voice_lang))
+            stream_reply("Find me nearby coffee shops", places_text, auto_speak, voice_lang)
         else:
             st.warning("Enable location first!")
 
@@ -599,10 +804,7 @@ with col2:
             with st.spinner("Searching..."):
                 places = search_nearby_places(lat, lon, "restaurant", search_radius * 1609)
                 places_text = format_places_for_voice(places, "restaurant")
-                response = get_roadbuddy_response("Find me nearby restaurants", places_text)
-            st.markdown(f'<div class="chat-bubble assistant-bubble">🚗 {response}</div>', unsafe_allow_html=True)
-            if auto_speak:
-                autoplay_audio(text_to_speech(response, voice_lang))
+            stream_reply("Find me nearby restaurants", places_text, auto_speak, voice_lang)
         else:
             st.warning("Enable location first!")
 
@@ -613,10 +815,7 @@ with col3:
             with st.spinner("Searching..."):
                 places = search_nearby_places(lat, lon, "gas", search_radius * 1609)
                 places_text = format_places_for_voice(places, "gas")
-                response = get_roadbuddy_response("Find me nearby gas stations", places_text)
-            st.markdown(f'<div class="chat-bubble assistant-bubble">🚗 {response}</div>', unsafe_allow_html=True)
-            if auto_speak:
-                autoplay_audio(text_to_speech(response, voice_lang))
+            stream_reply("Find me nearby gas stations", places_text, auto_speak, voice_lang)
         else:
             st.warning("Enable location first!")
 
@@ -627,10 +826,7 @@ with col4:
             with st.spinner("Searching..."):
                 places = search_nearby_places(lat, lon, "parking", search_radius * 1609)
                 places_text = format_places_for_voice(places, "parking")
-                response = get_roadbuddy_response("Find me a place to stop and rest", places_text)
-            st.markdown(f'<div class="chat-bubble assistant-bubble">🚗 {response}</div>', unsafe_allow_html=True)
-            if auto_speak:
-                autoplay_audio(text_to_speech(response, voice_lang))
+            stream_reply("Find me a place to stop and rest", places_text, auto_speak, voice_lang)
         else:
             st.warning("Enable location first!")
 
@@ -663,23 +859,17 @@ col1, col2, col3 = st.columns(3)
 
 with col1:
     if st.button("🎮 Game", use_container_width=True):
-        response = get_roadbuddy_response("Let's play a quick car game!")
-        if auto_speak:
-            autoplay_audio(text_to_speech(response, voice_lang))
+        stream_reply("Let's play a quick car game!", speak=auto_speak, lang=voice_lang)
         st.rerun()
 
 with col2:
     if st.button("💡 Tip", use_container_width=True):
-        response = get_roadbuddy_response("Give me a driving tip")
-        if auto_speak:
-            autoplay_audio(text_to_speech(response, voice_lang))
+        stream_reply("Give me a driving tip", speak=auto_speak, lang=voice_lang)
         st.rerun()
 
 with col3:
     if st.button("😴 Tired", use_container_width=True):
-        response = get_roadbuddy_response("I'm feeling tired")
-        if auto_speak:
-            autoplay_audio(text_to_speech(response, voice_lang))
+        stream_reply("I'm feeling tired", speak=auto_speak, lang=voice_lang)
         st.rerun()
 
 # Text input
@@ -688,27 +878,9 @@ user_input = st.text_input("Or type...", placeholder="Hey RoadBuddy...", label_v
 
 if user_input:
     # Check for places queries
-    places_context = ""
-    user_lower = user_input.lower()
+    places_context = find_places_for(user_input, search_radius * 1609)
     
-    if st.session_state.location:
-        lat = st.session_state.location["lat"]
-        lon = st.session_state.location["lon"]
-        radius_meters = search_radius * 1609
-        
-        if any(word in user_lower for word in ["coffee", "cafe"]):
-            places = search_nearby_places(lat, lon, "coffee", radius_meters)
-            places_context = format_places_for_voice(places, "coffee")
-        elif any(word in user_lower for word in ["food", "restaurant", "eat", "hungry"]):
-            places = search_nearby_places(lat, lon, "restaurant", radius_meters)
-            places_context = format_places_for_voice(places, "restaurant")
-        elif any(word in user_lower for word in ["gas", "fuel"]):
-            places = search_nearby_places(lat, lon, "gas", radius_meters)
-            places_context = format_places_for_voice(places, "gas")
-    
-    response = get_roadbuddy_response(user_input, places_context)
-    if auto_speak:
-        autoplay_audio(text_to_speech(response, voice_lang))
+    stream_reply(user_input, places_context, auto_speak, voice_lang)
     st.rerun()
 
 # Footer
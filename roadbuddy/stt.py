@@ -0,0 +1,186 @@
+import io
+import json
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Iterable, List, NamedTuple, Optional
+
+import numpy as np
+import speech_recognition as sr
+
+from audio_prep import SAMPLE_RATE, SAMPLE_WIDTH, duration, prepare
+
+
+class Transcript(NamedTuple):
+    text: Optional[str]
+    # Name of the backend that produced the text (or failed last)
+    backend: str
+    # Seconds spent recognizing, across every backend tried
+    latency: float
+    # Why recognition failed, when ``text`` is None
+    error: Optional[str] = None
+    # Length of the clip as recorded, and of the speech sent to the recognizer
+    recorded_seconds: float = 0.0
+    speech_seconds: float = 0.0
+
+
+class STTError(Exception):
+    """Recognition failed; the message says why (no speech, timeout, offline, ...)."""
+
+
+class STTBackend(ABC):
+    """
+    A speech-to-text engine. ``transcribe`` takes a whole clip;
+    ``transcribe_stream`` takes raw PCM chunks as they are recorded and
+    reports partial text along the way. Engines that cannot stream recognize
+    the joined chunks at the end.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def transcribe(self, audio: sr.AudioData) -> str:
+        """Recognize a whole clip; raises STTError when nothing was recognized."""
+
+    def transcribe_stream(
+        self,
+        chunks: Iterable[bytes],
+        on_partial: Optional[Callable[[str], None]] = None,
+        sample_rate: int = SAMPLE_RATE,
+    ) -> str:
+        return self.transcribe(sr.AudioData(b"".join(chunks), sample_rate, SAMPLE_WIDTH))
+
+
+class GoogleBackend(STTBackend):
+    """Google's free web recognizer (needs connectivity)."""
+
+    name = "google"
+
+    def __init__(self, language: str = "en-US", timeout: float = 8.0) -> None:
+        self.language = language
+        self.recognizer = sr.Recognizer()
+        self.recognizer.operation_timeout = timeout
+
+    def transcribe(self, audio: sr.AudioData) -> str:
+        try:
+            return self.recognizer.recognize_google(audio, language=self.language)
+        except sr.UnknownValueError:
+            raise STTError("no speech recognized") from None
+        except sr.RequestError as e:
+            raise STTError(f"service unavailable: {e}") from e
+        except TimeoutError:
+            raise STTError(f"timed out after {self.recognizer.operation_timeout:.0f}s") from None
+
+
+class VoskBackend(STTBackend):
+    """
+    Offline Kaldi recognizer (``pip install vosk`` plus a model directory from
+    https://alphacephei.com/vosk/models). The model is loaded once and reused
+    for every call; it recognizes incrementally, so it can stream.
+    """
+
+    name = "vosk"
+
+    def __init__(self, model_path: str) -> None:
+        try:
+            from vosk import Model, SetLogLevel
+        except ImportError as e:
+            raise ImportError("The offline Vosk backend requires vosk: pip install vosk") from e
+        SetLogLevel(-1)
+        self.model = Model(model_path)
+
+    def transcribe(self, audio: sr.AudioData) -> str:
+        return self.transcribe_stream([audio.get_raw_data(convert_rate=SAMPLE_RATE, convert_width=SAMPLE_WIDTH)])
+
+    def transcribe_stream(
+        self,
+        chunks: Iterable[bytes],
+        on_partial: Optional[Callable[[str], None]] = None,
+        sample_rate: int = SAMPLE_RATE,
+    ) -> str:
+        from vosk import KaldiRecognizer
+
+        recognizer = KaldiRecognizer(self.model, sample_rate)
+        for chunk in chunks:
+            if recognizer.AcceptWaveform(chunk):
+                partial = json.loads(recognizer.Result()).get("text", "")
+            else:
+                partial = json.loads(recognizer.PartialResult()).get("partial", "")
+            if on_partial and partial:
+                on_partial(partial)
+        text = json.loads(recognizer.FinalResult()).get("text", "").strip()
+        if not text:
+            raise STTError("no speech recognized")
+        return text
+
+
+class WhisperBackend(STTBackend):
+    """
+    Offline Whisper on the CPU through faster-whisper (``pip install
+    faster-whisper``). The model is loaded once and reused for every call.
+    """
+
+    name = "whisper"
+
+    def __init__(self, model: str = "base.en", language: str = "en") -> None:
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError as e:
+            raise ImportError("The offline Whisper backend requires faster-whisper: pip install faster-whisper") from e
+        self.language = language
+        self.model = WhisperModel(model, device="cpu", compute_type="int8")
+
+    def transcribe(self, audio: sr.AudioData) -> str:
+        pcm = audio.get_raw_data(convert_rate=SAMPLE_RATE, convert_width=SAMPLE_WIDTH)
+        samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+        segments, _ = self.model.transcribe(samples, language=self.language, beam_size=1, vad_filter=True)
+        text = " ".join(segment.text.strip() for segment in segments).strip()
+        if not text:
+            raise STTError("no speech recognized")
+        return text
+
+
+def load_audio(audio_bytes: bytes) -> sr.AudioData:
+    """Decode a WAV/AIFF/FLAC clip, as delivered by the recorder."""
+    try:
+        with sr.AudioFile(io.BytesIO(audio_bytes)) as source:
+            return sr.Recognizer().record(source)
+    except (ValueError, EOFError) as e:
+        raise STTError(f"unreadable audio: {e}") from e
+
+
+def transcribe(audio_bytes: bytes, backends: List[STTBackend], trim: bool = True) -> Transcript:
+    """
+    Recognize a clip with the first backend that succeeds, falling back to the
+    next one on failure. Returns the text with the backend used, the total
+    latency and, if every backend failed, the last failure reason.
+
+    The clip is first normalized to 16 kHz mono and, with ``trim``, cut down
+    to the speech, so recognizers get less audio to decode or upload. Clips
+    with no speech at all are not sent to any backend.
+    """
+    start = time.perf_counter()
+    try:
+        audio = load_audio(audio_bytes)
+    except STTError as e:
+        return Transcript(None, "decoder", time.perf_counter() - start, str(e))
+
+    recorded = duration(audio)
+    audio = prepare(audio, trim)
+    if audio is None:
+        return Transcript(None, "vad", time.perf_counter() - start, "no speech detected", recorded)
+    speech = duration(audio)
+
+    backend_name, error = "none", "no speech recognition backend available"
+    for backend in backends:
+        backend_name = backend.name
+        try:
+            text = backend.transcribe(audio)
+            return Transcript(text, backend.name, time.perf_counter() - start, None, recorded, speech)
+        except STTError as e:
+            error = str(e)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        if error == "no speech recognized":
+            # Another engine won't find speech in silence either
+            break
+    return Transcript(None, backend_name, time.perf_counter() - start, error, recorded, speech)
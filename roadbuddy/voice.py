@@ -0,0 +1,208 @@
+import hashlib
+import io
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from pathlib import Path
+from typing import List, Optional, Union
+
+from gtts import gTTS
+
+# gTTS encodes MP3 at a constant 32 kbps
+GTTS_BITRATE = 32_000
+
+# End of a sentence: terminal punctuation, optional closing quotes/brackets, whitespace
+SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*\s+")
+
+
+def synthesize(text: str, lang: str = "en") -> bytes:
+    """Synthesize text with Google TTS and return the MP3 bytes."""
+    fp = io.BytesIO()
+    gTTS(text=text, lang=lang, slow=False).write_to_fp(fp)
+    return fp.getvalue()
+
+
+def audio_duration(size: int) -> float:
+    """Estimate the playback length in seconds of a gTTS MP3 of ``size`` bytes."""
+    return size * 8 / GTTS_BITRATE
+
+
+class SpeechCache:
+    """
+    Disk cache of synthesized speech with LRU eviction under a byte cap.
+
+    Replies are synthesized sentence by sentence and every sentence clip is
+    cached on its own, so short phrases that repeat across replies ("Couldn't
+    catch that", safety nudges, game prompts) are only synthesized once.
+    """
+
+    def __init__(self, directory: Union[str, Path], max_bytes: int = 50 * 1024 * 1024) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.cleanup_orphans()
+        self._load()
+
+    @staticmethod
+    def key_for(text: str, lang: str) -> str:
+        normalized = " ".join(text.split())
+        return hashlib.sha256(f"{lang}\0{normalized}".encode("utf-8")).hexdigest()[:32]
+
+    def path_for(self, key: str) -> Path:
+        return self.directory / f"{key}.mp3"
+
+    def get(self, key: str) -> Optional[Path]:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            path = self.path_for(key)
+            if not path.exists():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return path
+
+    def put(self, key: str, audio: bytes) -> Path:
+        path = self.path_for(key)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(audio)
+        tmp_path.replace(path)
+        with self._lock:
+            self._entries[key] = len(audio)
+            self._entries.move_to_end(key)
+            self._evict(keep=key)
+        return path
+
+    def sentence_path(self, sentence: str, lang: str = "en") -> Path:
+        """Return the path of an MP3 for one sentence, synthesizing it if it is not cached."""
+        key = self.key_for(sentence, lang)
+        path = self.get(key)
+        if path is not None:
+            self.hits += 1
+            return path
+        self.misses += 1
+        return self.put(key, synthesize(sentence, lang))
+
+    def cleanup_orphans(self, max_age: float = 3600) -> None:
+        """Remove partial writes left behind by interrupted runs."""
+        cutoff = time.time() - max_age
+        for path in self.directory.glob("*.tmp"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except FileNotFoundError:
+                continue
+
+    def _load(self) -> None:
+        files = []
+        for path in self.directory.glob("*.mp3"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, path.stem, stat.st_size))
+        with self._lock:
+            for _, key, size in sorted(files):
+                self._entries[key] = size
+            self._evict()
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        total = sum(self._entries.values())
+        for key in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= self._entries.pop(key)
+            self.path_for(key).unlink(missing_ok=True)
+
+
+class SpeechStream:
+    """
+    Synthesizes a reply sentence by sentence while it is still being generated.
+
+    Text deltas are passed to ``feed`` as they arrive; every completed sentence
+    is synthesized through the ``SpeechCache`` on a small worker pool, and
+    ``next_clip`` hands the clips back strictly in reply order. The first
+    sentence can therefore play while Claude is still writing the rest.
+    """
+
+    def __init__(self, cache: SpeechCache, lang: str = "en", max_workers: int = 3) -> None:
+        self.cache = cache
+        self.lang = lang
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="roadbuddy-tts")
+        self._pending = ""
+        self._clips: List[Future] = []
+        self._next = 0
+        self._finished = False
+        self._ready = threading.Condition()
+
+    def feed(self, text: str) -> None:
+        self._pending += text
+        start = 0
+        for match in SENTENCE_END.finditer(self._pending):
+            self._submit(self._pending[start:match.end()])
+            start = match.end()
+        self._pending = self._pending[start:]
+
+    def finish(self) -> None:
+        """Synthesize whatever is left once the reply is complete."""
+        self._submit(self._pending)
+        self._pending = ""
+        with self._ready:
+            self._finished = True
+            self._ready.notify_all()
+        self._executor.shutdown(wait=False)
+
+    def next_clip(self, timeout: Optional[float] = None) -> Optional[Path]:
+        """
+        Return the path of the next sentence's audio once it is synthesized.
+
+        Returns None if it is not ready within ``timeout`` seconds (``None``
+        waits until it is) or once every clip of a finished reply has been
+        returned. Sentences that fail to synthesize are skipped.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._ready:
+                while self._next >= len(self._clips):
+                    if self._finished:
+                        return None
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return None
+                    self._ready.wait(remaining)
+                clip = self._clips[self._next]
+
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            if not clip.done() and remaining == 0:
+                return None
+            try:
+                path = clip.result(timeout=remaining)
+            except TimeoutError:
+                return None
+            except Exception:
+                path = None
+            with self._ready:
+                self._next += 1
+            if path is not None:
+                return path
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, sentence: str) -> None:
+        sentence = sentence.strip()
+        if not sentence:
+            return
+        clip = self._executor.submit(self.cache.sentence_path, sentence, self.lang)
+        with self._ready:
+            self._clips.append(clip)
+            self._ready.notify_all()
@@ -0,0 +1,197 @@
+import io
+import re
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+
+from gtts import gTTS
+
+# gTTS returns 32 kbps mono MP3, which lets us estimate clip length from its size
+GTTS_BITRATE = 32_000
+
+# End of a sentence: terminal punctuation, optional closing quotes/brackets, whitespace
+_SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*\s+")
+
+# Target size of a chunk synthesized by one worker in chunked synthesis
+CHUNK_CHARS = 600
+
+
+def synthesize(text: str, lang: str = "en") -> bytes:
+    """Synthesize text with Google TTS and return the MP3 bytes."""
+    fp = io.BytesIO()
+    gTTS(text=text, lang=lang, slow=False).write_to_fp(fp)
+    return fp.getvalue()
+
+
+def synthesize_with_retry(text: str, lang: str = "en", retries: int = 2, backoff: float = 1.0) -> bytes:
+    """Synthesize text, retrying transient failures with exponential backoff."""
+    for attempt in range(retries + 1):
+        try:
+            return synthesize(text, lang)
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+
+def split_chunks(text: str, max_chars: int = CHUNK_CHARS) -> List[str]:
+    """
+    Split text into chunks of up to ``max_chars`` on paragraph and sentence
+    boundaries. A single sentence longer than ``max_chars`` becomes its own chunk.
+    """
+    chunks = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        buffer = SentenceBuffer()
+        sentences = buffer.feed(paragraph) + buffer.flush()
+        current = ""
+        for sentence in sentences:
+            if current and len(current) + 1 + len(sentence) > max_chars:
+                chunks.append(current)
+                current = sentence
+            else:
+                current = f"{current} {sentence}" if current else sentence
+        if current:
+            chunks.append(current)
+    return chunks
+
+
+def strip_id3(audio: bytes) -> bytes:
+    """Drop a leading ID3v2 tag so MP3 chunks can be joined frame to frame."""
+    if len(audio) >= 10 and audio[:3] == b"ID3":
+        size = (audio[6] << 21) | (audio[7] << 14) | (audio[8] << 7) | audio[9]
+        footer = 10 if audio[5] & 0x10 else 0
+        return audio[10 + size + footer:]
+    return audio
+
+
+def synthesize_chunked(
+    text: str,
+    lang: str = "en",
+    max_workers: int = 4,
+    retries: int = 2,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> bytes:
+    """
+    Synthesize long text by splitting it into chunks, synthesizing them in a
+    bounded thread pool and joining the MP3 frames in order without
+    re-encoding. ``on_progress`` is called from the calling thread with
+    ``(chunks_done, chunks_total)`` as chunks finish.
+    """
+    chunks = split_chunks(text)
+    if not chunks:
+        return b""
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts") as executor:
+        futures = {
+            executor.submit(synthesize_with_retry, chunk, lang, retries): index
+            for index, chunk in enumerate(chunks)
+        }
+        audio: List[bytes] = [b""] * len(chunks)
+        for done, future in enumerate(as_completed(futures), 1):
+            audio[futures[future]] = future.result()
+            if on_progress is not None:
+                on_progress(done, len(chunks))
+    return audio[0] + b"".join(strip_id3(clip) for clip in audio[1:])
+
+
+def audio_duration(audio: bytes) -> float:
+    """Estimate the playback length in seconds of gTTS MP3 bytes."""
+    return len(audio) * 8 / GTTS_BITRATE
+
+
+class SentenceBuffer:
+    """
+    Accumulates streamed text and hands back every sentence once it is complete.
+    """
+
+    def __init__(self) -> None:
+        self._pending = ""
+
+    def feed(self, text: str) -> List[str]:
+        self._pending += text
+        sentences = []
+        start = 0
+        for match in _SENTENCE_END.finditer(self._pending):
+            sentence = self._pending[start:match.end()].strip()
+            if sentence:
+                sentences.append(sentence)
+            start = match.end()
+        self._pending = self._pending[start:]
+        return sentences
+
+    def flush(self) -> List[str]:
+        sentence = self._pending.strip()
+        self._pending = ""
+        return [sentence] if sentence else []
+
+
+class StreamingSpeech:
+    """
+    Synthesizes a tour sentence by sentence while its sections are still being
+    written. Sections are fed concurrently but audio is released strictly in
+    tour order, so the opening of the first section can play while the rest of
+    the tour is still being generated.
+    """
+
+    def __init__(self, sections: List[str], lang: str = "en", max_workers: int = 4) -> None:
+        self.sections = list(sections)
+        self.lang = lang
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts")
+        self._buffers: Dict[str, SentenceBuffer] = {section: SentenceBuffer() for section in self.sections}
+        self._clips: Dict[str, List[Future]] = {section: [] for section in self.sections}
+        self._finished: set = set()
+        # Audio handed out so far and the next clip to append to it
+        self._audio = bytearray()
+        self._section_index = 0
+        self._clip_index = 0
+        # Sentences whose synthesis failed and are missing from the audio
+        self.failed_clips = 0
+
+    def feed(self, section: str, text: str) -> None:
+        for sentence in self._buffers[section].feed(text):
+            self._submit(section, sentence)
+
+    def finish(self, section: str) -> None:
+        if section in self._finished:
+            return
+        for sentence in self._buffers[section].flush():
+            self._submit(section, sentence)
+        self._finished.add(section)
+
+    def new_audio(self) -> bytes:
+        """
+        Return the audio synthesized since the previous call that continues
+        the tour contiguously from its start. Clips already handed out are
+        not revisited.
+        """
+        start = len(self._audio)
+        while self._section_index < len(self.sections):
+            section = self.sections[self._section_index]
+            clips = self._clips[section]
+            while self._clip_index < len(clips) and clips[self._clip_index].done():
+                clip = clips[self._clip_index]
+                if clip.exception() is None:
+                    self._audio += clip.result() if not self._audio else strip_id3(clip.result())
+                else:
+                    self.failed_clips += 1
+                self._clip_index += 1
+            if self._clip_index < len(clips) or section not in self._finished:
+                break
+            self._section_index += 1
+            self._clip_index = 0
+        return bytes(self._audio[start:])
+
+    def ready_audio(self) -> bytes:
+        """Return all audio that is synthesized contiguously from the start of the tour."""
+        self.new_audio()
+        return bytes(self._audio)
+
+    def is_complete(self) -> bool:
+        return len(self._finished) == len(self.sections) and all(
+            clip.done() for clips in self._clips.values() for clip in clips
+        )
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, section: str, sentence: str) -> None:
+        self._clips[section].append(self._executor.submit(synthesize_with_retry, sentence, self.lang))
@@ -0,0 +1,18 @@
+from agent import Culture, History, TourFrame, assemble_tour
+
+
+def test_assemble_tour_accepts_capitalized_transition_keys():
+    frame = TourFrame(
+        introduction="Welcome.",
+        transitions={"History": "Let's step back in time.", " Culture ": "Now for the people."},
+        conclusion="Goodbye.",
+    )
+    research_results = {
+        "history": History(output="The old town was founded in 1200."),
+        "culture": Culture(output="Locals gather in the square."),
+    }
+
+    tour = assemble_tour(frame, ["History", "Culture"], research_results)
+
+    assert tour.history == "Let's step back in time.\n\nThe old town was founded in 1200."
+    assert tour.culture == "Now for the people.\n\nLocals gather in the square."